@@ -23,6 +23,16 @@ LAST UPDATE:  2019-02-12 -- fixed bug in working string insert operation
                          -- added calculation for Levenshtein similarity ratio
 
 USAGE:      >python LD.py
+            >python LD.py --batch pairs.tsv --cutoff 3 --workers 4 > results.jsonl
+            >python LD.py --files old.log new.log --ops
+
+            Without arguments the interactive demo runs.  --batch streams
+            pairs (tab separated, or JSON lines with "source" and "target")
+            from a file or stdin and writes one JSON line per pair with the
+            distance and ratio (and the edit operations with --ops).
+            --files compares two files line by line (token by token with
+            --tokens) and writes one JSON line.
+            Importing LD.py has no side effects.
 
 OUTPUT:
             Final Distance Matrix:
@@ -70,6 +80,9 @@ COMMENTS:
 
 =====================================================================
 """
+import time
+from array import array
+
 # global constants
 _string1 = "lawn"
 _string2 = "flaw"
@@ -78,6 +91,21 @@ _ins_cost = 1
 _sub_cost = 1
 _debug = 1
 
+# smallest matrix (in cells) worth handing to the numpy engine
+_numpy_min_cells = 1024
+
+# numpy module, or False when it is not installed.  Loaded on first use
+_np = None
+
+# choices shared with the worker processes of the batch functions
+_pool_choices = None
+
+# result cache, see enable_cache()
+_cache = None
+
+# shared state of the worker processes of find_ld_parallel
+_tile = None
+
 
 def get_user_input():
     """
@@ -104,58 +132,499 @@ def get_user_input():
     return string1, string2, int(debug),
 
 
+def _cell_typecode(s_len, t_len, c):
+    """
+    Pick the array typecode for the cells of an LD matrix.  No cell is larger
+    than deleting all of s and inserting all of t, and the vectorized engines
+    add one substitution (never dearer than a delete plus an insert, see
+    find_ld_numpy) to a cell before taking the min, so array('i') is used
+    while that sum fits in 32 bits, array('q') for larger integer costs and
+    array('d') for float costs.
+
+    :param s_len: length of the source
+    :param t_len: length of the target
+    :param c: cost tuple [delete, insert, sub]
+
+    :return: str:typecode
+    """
+
+    if not all(isinstance(x, int) for x in c):
+        return "d"
+    sub = min(abs(c[2]), abs(c[0]) + abs(c[1]))
+    if s_len * abs(c[0]) + t_len * abs(c[1]) + sub > 2 ** 31 - 1:
+        return "q"
+    return "i"
+
+
+class LDMatrix(object):
+    """
+    Matrix stored row by row in one flat typed buffer: array('i') or
+    array('q') for integer costs (see _cell_typecode), array('d') for float
+    costs and bytearray for the one character operation codes.  m[row]
+    returns a view of the row, so m[row][col] reads and writes cells the
+    same way as a list of lists, and to_numpy() gives a NumPy view without
+    copying.
+    """
+
+    def __init__(self, rows, cols, typecode="q", fill=0, data=None):
+        """
+        :param rows: number of rows
+        :param cols: number of columns
+        :param typecode: array typecode of the cells, or "c" for one character
+                         strings (stored in a bytearray)
+        :param fill: initial value of every cell
+        :param data: existing flat buffer of rows * cols cells to wrap
+        """
+
+        self.rows = rows
+        self.cols = cols
+        self.typecode = typecode
+        if data is not None:
+            self.data = data
+        elif typecode == "c":
+            self.data = bytearray(fill.encode("latin-1")) * (rows * cols)
+        else:
+            self.data = array(typecode, [fill]) * (rows * cols)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if not 0 <= row < self.rows:
+            raise IndexError("matrix row out of range")
+        start = row * self.cols
+        if self.typecode == "c":
+            return _CharRow(self.data, start, self.cols)
+        return memoryview(self.data)[start:start + self.cols]
+
+    def tolist(self):
+        """
+        :return: list of lists:cells
+        """
+
+        return [list(self[row]) for row in range(self.rows)]
+
+    def to_numpy(self):
+        """
+        :return: 2D numpy array sharing the buffer, or None if numpy is not
+                 installed
+        """
+
+        np = _numpy()
+        if np is None:
+            return None
+        dtype = {"i": np.intc, "q": np.int64, "d": np.float64, "c": np.uint8}[self.typecode]
+        return np.frombuffer(self.data, dtype=dtype).reshape(self.rows, self.cols)
+
+
+class _CharRow(object):
+    """
+    Row view of a character LDMatrix.
+    """
+
+    __slots__ = ("data", "start", "cols")
+
+    def __init__(self, data, start, cols):
+        self.data = data
+        self.start = start
+        self.cols = cols
+
+    def __len__(self):
+        return self.cols
+
+    def __getitem__(self, col):
+        return chr(self.data[self.start + col])
+
+    def __setitem__(self, col, value):
+        self.data[self.start + col] = ord(value)
+
+
+class LDPath(object):
+    """
+    Minimum cost path through an LD matrix, as the list of (row, col) cells
+    it visits.  A path only moves right and down, so in each row it covers
+    one run of columns; those runs are kept per row so the path can be shown
+    and looked up like the sparse matrix it replaces: path[row][col] is the
+    cost in dist for cells on the path and " " elsewhere.
+    """
+
+    def __init__(self, dist):
+        """
+        :param dist: LD matrix the path runs through
+        """
+
+        self.dist = dist
+        self.rows = len(dist)
+        self.cols = len(dist[0])
+        self.coords = []
+        self._lo = array("i", [self.cols]) * self.rows
+        self._hi = array("i", [-1]) * self.rows
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if not 0 <= row < self.rows:
+            raise IndexError("path row out of range")
+        return _PathRow(self, row)
+
+    def add(self, row, col):
+        """
+        Add a cell to the path.
+
+        :param row: row of the cell
+        :param col: column of the cell
+        """
+
+        self.coords.append((row, col))
+        if col < self._lo[row]:
+            self._lo[row] = col
+        if col > self._hi[row]:
+            self._hi[row] = col
+
+    def on_path(self, row, col):
+        """
+        :return: bool:True if (row, col) is on the path
+        """
+
+        return self._lo[row] <= col <= self._hi[row]
+
+
+class _PathRow(object):
+    """
+    Row view of an LDPath.
+    """
+
+    __slots__ = ("path", "row")
+
+    def __init__(self, path, row):
+        self.path = path
+        self.row = row
+
+    def __len__(self):
+        return self.path.cols
+
+    def __getitem__(self, col):
+        if self.path.on_path(self.row, col):
+            return self.path.dist[self.row][col]
+        if self.row == 0 and col == 0:
+            return "0"
+        return " "
+
+
+class Tracer(object):
+    """
+    Observer for the LD calculations.  find_ld, find_min_path and
+    build_ops_matrix_and_ws take an optional tracer and report to it; every
+    hook here does nothing, so a subclass only overrides what it needs.
+
+    Per-cell events are only sent to tracers with wants_cells set.  For all
+    other tracers (and without a tracer) the cell loop runs without any
+    checks, and the faster engines stay in use.
+    """
+
+    # receive cell() events, which forces the cell by cell engine
+    wants_cells = False
+
+    def begin(self, phase, s, t, c):
+        """
+        A phase starts.
+
+        :param phase: name of the function, e.g. "find_ld"
+        :param s: source string
+        :param t: target string
+        :param c: cost tuple [delete, insert, sub], or None
+        """
+
+    def end(self, phase, cells):
+        """
+        A phase is done.
+
+        :param phase: name of the function
+        :param cells: number of matrix cells (or path steps) it covered, 0
+                      for distance only calls
+        """
+
+    def matrix(self, title, m):
+        """
+        A matrix is ready to be shown, e.g. the initial distance matrix.
+
+        :param title: what the matrix is
+        :param m: the matrix
+        """
+
+    def cell(self, row, col, del_cost, ins_cost, sub_cost, same, op, m):
+        """
+        find_ld computed a cell.
+
+        :param row: row of the cell
+        :param col: column of the cell
+        :param del_cost: cost of reaching the cell with a delete
+        :param ins_cost: cost of reaching the cell with an insert
+        :param sub_cost: cost of reaching the cell with a substitution
+        :param same: whether the letters are the same
+        :param op: operation chosen: "delete", "insert" or "substitute"
+        :param m: the distance matrix
+        """
+
+    def path_step(self, prev_row, prev_col, row, col, cost, m):
+        """
+        find_min_path took a step back along the path.
+
+        :param prev_row: row moved from
+        :param prev_col: column moved from
+        :param row: row moved to
+        :param col: column moved to
+        :param cost: cost at the new cell
+        :param m: the path so far
+        """
+
+
+class PrintTracer(Tracer):
+    """
+    Print every step of the calculation (verbose output level 2).
+    """
+
+    wants_cells = True
+
+    def __init__(self):
+        self.s = ""
+        self.t = ""
+        self.c = (1, 1, 1)
+
+    def begin(self, phase, s, t, c):
+        self.s = s
+        self.t = t
+        if c is not None:
+            self.c = c
+
+    def matrix(self, title, m):
+        print()
+        print(title)
+        print_matrix(self.s, self.t, m)
+
+    def cell(self, row, col, del_cost, ins_cost, sub_cost, same, op, m):
+        cst_str = "  {} ({},{}) cost: {}  value: {}"
+        d_cost, i_cost, s_cost = self.c
+
+        print("Position: row={} col={}".format(str(row), str(col)))
+        print("Letters: {} -> {}".format(str(self.s[row - 1]), str(self.t[col - 1])))
+        print(cst_str.format("delete", str(row - 1), str(col), str(d_cost), str(del_cost)))
+        print(cst_str.format("insert", str(row), str(col - 1), str(i_cost), str(ins_cost)))
+        if same:
+            print(cst_str.format("substitute (no change)", str(row - 1), str(col - 1), "0", str(sub_cost)))
+        else:
+            print(cst_str.format("substitute", str(row - 1), str(col - 1), str(s_cost), str(sub_cost)))
+        print("Operation: {}, Cost: {}".format(op, min(del_cost, ins_cost, sub_cost)))
+        print()
+        print_matrix(self.s, self.t, m)
+
+    def path_step(self, prev_row, prev_col, row, col, cost, m):
+        print("Position: (row={} col={}) -> (row={} col={})".format(str(prev_row), str(prev_col), str(row), str(col)))
+        print("Cost: {}".format(cost))
+        print()
+        print_matrix(self.s, self.t, m)
+
+
+class StatsTracer(Tracer):
+    """
+    Count calls, cells and path steps and time each phase, for profiling.
+    Does not ask for cell events, so the fast engines stay in use.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Zero all counters.
+        """
+
+        self.calls = {}
+        self.cells = {}
+        self.seconds = {}
+        self.path_steps = 0
+        self._started = {}
+
+    def begin(self, phase, s, t, c):
+        self._started[phase] = time.perf_counter()
+
+    def end(self, phase, cells):
+        elapsed = time.perf_counter() - self._started.pop(phase, time.perf_counter())
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        self.cells[phase] = self.cells.get(phase, 0) + cells
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + elapsed
+
+    def path_step(self, prev_row, prev_col, row, col, cost, m):
+        self.path_steps += 1
+
+    def stats(self):
+        """
+        :return: dict with calls, cells and seconds (each a dict by phase)
+                 and path_steps
+        """
+
+        return {"calls": dict(self.calls),
+                "cells": dict(self.cells),
+                "seconds": dict(self.seconds),
+                "path_steps": self.path_steps}
+
+
 def print_matrix(s, t, m, p=2):
     """
     Print the matrix with the target string on top and the source
-    string down the side.
+    string down the side.  See render_matrix for large matrices.
 
     :param s: source string
     :param t: target string
-    :param m: matrix to print (list of lists)
+    :param m: matrix to print (LDMatrix, LDPath or list of lists)
     :param p: padding factor, defaults to 2
 
     :return: str:output
     """
-    rows = len(m)
-    cols = len(m[0])
-    output = "  "
+    import io
 
-    # print target word across top of matrix
-    output += " #" + " " * p
-    for i in range(cols - 1):
-        output += str(t[i]) + " " * p
-    output += "\n"
+    output = io.StringIO()
+    render_matrix(s, t, m, output, p)
+    output = output.getvalue()
 
-    # print source word vertically before each row
-    for r in range(rows):
-        if r > 0:
-            output += str(s[r - 1]) + " ["
-        else:
-            output += "# ["
+    print(output)
+    return output
 
-        # print matrix rows
-        for c in range(cols):
-            output += str(m[r][c])
 
-            if c == cols - 1:
-                output += "]\n"
-            else:
-                output += ", "
+def _row_cells(row_v, start, stop):
+    """
+    Cells start..stop-1 of a matrix row as strings.
+
+    :param row_v: matrix row (memoryview, list or row view)
+    :param start: first column
+    :param stop: column after the last one
+
+    :return: list:cells
+    """
+
+    if isinstance(row_v, (memoryview, list)):
+        return [str(x) for x in row_v[start:stop]]
+    return [str(row_v[c]) for c in range(start, stop)]
 
-    print(output)
-    return output
 
+def render_matrix(s, t, m, out=None, p=2, rows=None, cols=None, path=None, margin=3, max_rows=None):
+    """
+    Write the matrix with the target string on top and the source string
+    down the side, one row at a time, to any file-like object.  Nothing is
+    built up in memory, and the output can be cut down to a window:
+
+        rows=(start, stop) and cols=(start, stop) only show that block;
+        path=LDPath only shows, in each row, the columns the path covers
+        plus margin cells either side (the column range is shown after the
+        row, as the rows no longer line up under the header);
+        max_rows shows the first and last max_rows // 2 rows only.
+
+    Cut off cells are shown as "..".
+
+    :param s: source string
+    :param t: target string
+    :param m: matrix to write (LDMatrix, LDPath or list of lists)
+    :param out: file-like object, defaults to sys.stdout
+    :param p: padding factor, defaults to 2
+    :param rows: (start, stop) range of rows to show, defaults to all
+    :param cols: (start, stop) range of columns to show, defaults to all
+    :param path: LDPath to window each row around, defaults to None
+    :param margin: cells shown either side of the path, defaults to 3
+    :param max_rows: max number of rows to show, defaults to all
+    """
 
-def find_min_path(s, t, dist):
+    if out is None:
+        import sys
+        out = sys.stdout
+
+    n_rows = len(m)
+    n_cols = len(m[0])
+    r0, r1 = rows if rows is not None else (0, n_rows)
+    c0, c1 = cols if cols is not None else (0, n_cols)
+    r0, r1 = max(0, r0), min(n_rows, r1)
+    c0, c1 = max(0, c0), min(n_cols, c1)
+
+    # target word across top of matrix
+    if path is None:
+        lead = ".., " if c0 > 0 else ""
+        labels = ["#" if c == 0 else str(t[c - 1]) for c in range(c0, c1)]
+        out.write("   " + " " * len(lead) + "".join(x + " " * p for x in labels) + "\n")
+
+    show = range(r0, r1)
+    skip_from = skip_to = None
+    if max_rows is not None and len(show) > max_rows:
+        skip_from = r0 + max_rows // 2
+        skip_to = r1 - (max_rows - max_rows // 2)
+
+    for r in show:
+        if skip_from is not None and skip_from <= r < skip_to:
+            if r == skip_from:
+                out.write(".. [{} rows]\n".format(skip_to - skip_from))
+            continue
+
+        # source word vertically before each row
+        label = str(s[r - 1]) if r > 0 else "#"
+
+        lo, hi = c0, c1
+        if path is not None:
+            on = [c for c in (path._lo[r], path._hi[r]) if 0 <= c < n_cols]
+            if on:
+                lo = max(c0, min(on) - margin)
+                hi = min(c1, max(on) + margin + 1)
+
+        line = label + " [" + (".., " if lo > 0 else "") + ", ".join(_row_cells(m[r], lo, hi))
+        line += (", ..]" if hi < n_cols else "]")
+        if path is not None and (lo > 0 or hi < n_cols):
+            line += "  cols {}-{}".format(lo, hi - 1)
+        out.write(line + "\n")
+
+
+def export_matrix(m, out, fmt="csv"):
+    """
+    Write the raw cells of a matrix, one row at a time.
+
+    :param m: matrix to export (LDMatrix or list of lists)
+    :param out: file-like object; opened in binary mode for fmt="bin"
+    :param fmt: "csv" for comma separated rows, or "bin" for the cells as
+                machine order binary values in row order (array('i') cells
+                for integer costs, array('q') when they do not fit in 32 bits,
+                array('d') for float costs), e.g. to load with
+                numpy.fromfile(name, numpy.intc).reshape(rows, cols)
+    """
+
+    if fmt == "csv":
+        for r in range(len(m)):
+            out.write(",".join(_row_cells(m[r], 0, len(m[r]))) + "\n")
+    elif fmt == "bin":
+        if isinstance(m, LDMatrix) and m.typecode != "c":
+            out.write(memoryview(m.data).cast("B"))
+        else:
+            # one typecode for the whole matrix, so every row has the same width
+            cells = [x for r in range(len(m)) for x in m[r]]
+            if not all(isinstance(x, int) for x in cells):
+                typecode = "d"
+            elif all(-2 ** 31 <= x < 2 ** 31 for x in cells):
+                typecode = "i"
+            else:
+                typecode = "q"
+            for r in range(len(m)):
+                out.write(array(typecode, list(m[r])).tobytes())
+    else:
+        raise ValueError("unknown export format: " + str(fmt))
+
+
+def find_min_path(s, t, dist, tracer=None):
     """
     Find minimum path through cost matrix, working backwards from (r,c) -> (0,0).
     Populate a sparse matrix with the cost values representing the min path.
 
     :param s: source string
     :param t: target string
-    :param dist: LD matrix (list of lists)
+    :param dist: LD matrix (LDMatrix or list of lists)
+    :param tracer: Tracer to report each step to, defaults to None
 
-    :return: list of lists:sparse_matrix
+    :return: LDPath:sparse_matrix, listing the path cells from (0,0) -> (r,c)
 
         For each "backward" step, consider the 3 cells directly adjacent to the current
         cell   (in the left, top or left+top directions)
@@ -179,22 +648,18 @@ def find_min_path(s, t, dist):
     cols = len(dist[0]) - 1
     col = cols
     row = rows
-    pos_str = "Position: (row={} col={}) -> (row={} col={})"
-    cst_str = "Cost: {}"
     prev_row = row
     prev_col = col
 
     # init sparse path matrix
-    sparse_path = [[" " for x in range(cols + 1)] for x in range(rows + 1)]
-    sparse_path[0][0] = "0"
+    sparse_path = LDPath(dist)
 
     # start with operation at (rows, cols) and work backwards
-    sparse_path[rows][cols] = dist[rows][cols]
+    sparse_path.add(rows, cols)
 
-    if verbose == 2:
-        print()
-        print("Initial Minimum Path Matrix:")
-        print_matrix(s, t, sparse_path)
+    if tracer is not None:
+        tracer.begin("find_min_path", s, t, None)
+        tracer.matrix("Initial Minimum Path Matrix:", sparse_path)
 
     while True:
 
@@ -209,7 +674,7 @@ def find_min_path(s, t, dist):
             if (dist[row - 1][col - 1] == min(dist[row - 1][col],
                                               dist[row][col - 1],
                                               dist[row - 1][col - 1])) and (dist[row - 1][col - 1] == dist[row][col] or dist[row - 1][col - 1] == dist[row][col] - 1):
-                sparse_path[row - 1][col - 1] = dist[row - 1][col - 1]
+                sparse_path.add(row - 1, col - 1)
                 temp_cost = dist[row - 1][col - 1]
 
                 # move current cell
@@ -220,14 +685,9 @@ def find_min_path(s, t, dist):
                 if row > 0:
                     row -= 1
 
-                if verbose == 2:
-                    print(pos_str.format(str(prev_row), str(prev_col), str(row), str(col)))
-                    print(cst_str.format(temp_cost))
-                    print()
-
             # left
             elif dist[row][col - 1] <= dist[row][col]:
-                sparse_path[row][col - 1] = dist[row][col - 1]
+                sparse_path.add(row, col - 1)
                 temp_cost = dist[row][col - 1]
 
                 # move current cell
@@ -236,14 +696,9 @@ def find_min_path(s, t, dist):
                 if col > 0:
                     col -= 1
 
-                if verbose == 2:
-                    print(pos_str.format(str(prev_row), str(prev_col), str(row), str(col)))
-                    print(cst_str.format(temp_cost))
-                    print()
-
             # above
             else:
-                sparse_path[row - 1][col] = dist[row - 1][col]
+                sparse_path.add(row - 1, col)
                 temp_cost = dist[row - 1][col]
 
                 # move current cell
@@ -252,15 +707,10 @@ def find_min_path(s, t, dist):
                 if row > 0:
                     row -= 1
 
-                if verbose == 2:
-                    print(pos_str.format(str(prev_row), str(prev_col), str(row), str(col)))
-                    print(cst_str.format(temp_cost))
-                    print()
-
         # if at matrix edge, can only move up
         elif col == 0:
             # above
-            sparse_path[row - 1][col] = dist[row - 1][col]
+            sparse_path.add(row - 1, col)
             temp_cost = dist[row - 1][col]
 
             # move current cell
@@ -269,16 +719,11 @@ def find_min_path(s, t, dist):
             if row > 0:
                 row -= 1
 
-            if verbose == 2:
-                print(pos_str.format(str(prev_row), str(prev_col), str(row), str(col)))
-                print(cst_str.format(temp_cost))
-                print()
-
         # must be at row boundary, can only move left
         else:
             # left
             if dist[row][col - 1] <= dist[row][col]:
-                sparse_path[row][col - 1] = dist[row][col - 1]
+                sparse_path.add(row, col - 1)
             temp_cost = dist[row][col - 1]
 
             # move current cell
@@ -287,19 +732,16 @@ def find_min_path(s, t, dist):
             if col > 0:
                 col -= 1
 
-            if verbose == 2:
-                print(pos_str.format(str(prev_row), str(prev_col), str(row), str(col)))
-                print(cst_str.format(temp_cost))
-                print()
-
-        # print matrix
-        if verbose == 2:
-            print_matrix(s, t, sparse_path)
+        if tracer is not None:
+            tracer.path_step(prev_row, prev_col, row, col, temp_cost, sparse_path)
 
+    sparse_path.coords.reverse()
+    if tracer is not None:
+        tracer.end("find_min_path", len(sparse_path.coords))
     return sparse_path
 
 
-def build_ops_matrix_and_ws(s, t, min_m):
+def build_ops_matrix_and_ws(s, t, min_m, tracer=None):
     """
     Build a sparse matrix containing the operations associated with each
     cost in the min path matrix.  At the same time, manipulates the source
@@ -307,9 +749,10 @@ def build_ops_matrix_and_ws(s, t, min_m):
 
     :param s: source string
     :param t: target string
-    :param min_m: sparse min cost matrix
+    :param min_m: sparse min cost matrix (LDPath or list of lists)
+    :param tracer: Tracer to report to, defaults to None
 
-    :return: list:edits, list of lists:ops
+    :return: list:edits, LDMatrix:ops
 
         This logic works from (0,0) -> (rows,cols) looking for values in
         adjacent cells as it traverses the min cost matrix.  When it finds
@@ -318,6 +761,9 @@ def build_ops_matrix_and_ws(s, t, min_m):
 
     """
 
+    if tracer is not None:
+        tracer.begin("build_ops_matrix_and_ws", s, t, None)
+
     # init edit vars
     working_string = s
     edits = [s]
@@ -326,7 +772,7 @@ def build_ops_matrix_and_ws(s, t, min_m):
     cols = len(min_m[0]) - 1
 
     # init ops matrix with spaces in each cell, except (0,0)
-    ops = [[" " for x in range(cols + 1)] for x in range(rows + 1)]
+    ops = LDMatrix(rows + 1, cols + 1, "c", " ")
     ops[0][0] = "0"
 
     col = 0
@@ -368,7 +814,7 @@ def build_ops_matrix_and_ws(s, t, min_m):
                 elif col == cols:
                     working_string = working_string + str(t[col])
                 else:
-                    working_string = working_string[:row - 1] + str(t[col]) + working_string[row - 1:]
+                    working_string = working_string[:col] + str(t[col]) + working_string[col:]
                 edits.append(working_string + " <- insert '" + str(t[col]) + "' pos: " + str(col))
 
                 # move current cell
@@ -423,215 +869,3445 @@ def build_ops_matrix_and_ws(s, t, min_m):
                 elif col == cols:
                     working_string = working_string + str(t[col])
                 else:
-                    working_string = working_string[:row] + str(t[col]) + working_string[row:]
+                    working_string = working_string[:col] + str(t[col]) + working_string[col:]
                 edits.append(working_string + " <- insert '" + str(t[col]) + "' pos: " + str(col))
 
                 # update current cell
                 if col < cols:
                     col += 1
 
+    if tracer is not None:
+        tracer.end("build_ops_matrix_and_ws", len(edits) - 1)
     return edits, ops
 
 
-def find_ld(s, t, c=(1, 1, 1)):
+def find_ld_distance(s, t, c=(1, 1, 1)):
     """
-    This code calculates the LD cost matrix.  Most of this code was adopted from
-    www.python-course.eu/levenshtein_distance.php.
+    Calculate only the LD between s and t.  The cost matrix is never built;
+    a single row of it plus one scalar (the diagonal cell) is kept, so memory
+    is O(min(len(s), len(t))) instead of O(len(s) * len(t)).
 
     :param s: source string
     :param t: target string
     :param c: cost tuple [delete, insert, sub]
 
-    :return: int:ld, list of lists:dist
+    :return: int:ld
+    """
 
-        ldist is the Levenshtein distance between the strings s and t.
-        For all i and j, dist[i,j] will contain the Levenshtein
-        distance between the first i characters of s and the
-        first j characters of t
+    d_cost, i_cost, s_cost = c
 
-        costs: a tuple or a list with three integers (d, i, s)
-               where d defines the costs for a deletion
-                     i defines the costs for an insertion and
-                     s defines the costs for a substitution
+    # keep the row along the shorter string.  Swapping source and target
+    # turns every delete into an insert (and vice versa), so swap those costs too
+    if len(s) < len(t):
+        s, t = t, s
+        d_cost, i_cost = i_cost, d_cost
 
-        a horizontal move is an insertion of a letter from the 't string'
-        a vertical move is a deletion of a letter from the 's string'
-        a diagonal move is either:
-            a no-operation (both letters at respective positions are the same)
-            a substitution (letters at respective positions are distinct)
+    return _last_row(s, t, (d_cost, i_cost, s_cost))[-1]
+
+
+def _strip_affix(s, t):
+    """
+    Remove the common prefix and suffix of s and t.  Matching ends never
+    change the LD, so the engines only need to look at what is left.
+
+    :param s: source string
+    :param t: target string
+
+    :return: str:s, str:t
     """
 
-    # output string templates
-    pos_str = "Position: row={} col={}"
-    let_str = "Letters: {} -> {}"
-    op_str = "Operation: {}, Cost: {}"
-    cst_str = "  {} ({},{}) cost: {}  value: {}"
+    limit = min(len(s), len(t))
+    pre = 0
+    while pre < limit and s[pre] == t[pre]:
+        pre += 1
 
-    # keep the shape of the matrix consistent.  The algorithm is symmetric
+    limit -= pre
+    suf = 0
+    while suf < limit and s[-1 - suf] == t[-1 - suf]:
+        suf += 1
+
+    return s[pre:len(s) - suf], t[pre:len(t) - suf]
+
+
+def _build_masks(p):
+    """
+    Build the pattern match masks used by the bit-parallel engines.  Bit i
+    of masks[ch] is set when p[i] == ch.
+
+    :param p: pattern string
+
+    :return: dict:masks
+    """
+
+    masks = {}
+    bit = 1
+    for ch in p:
+        masks[ch] = masks.get(ch, 0) | bit
+        bit <<= 1
+    return masks
+
+
+def _myers_distance(masks, m, t):
+    """
+    Unit cost LD between a pattern of length m (described by its match
+    masks) and t.  This is Hyyro's formulation of Myers' bit-vector
+    algorithm: one column of the LD matrix is encoded as two bit vectors of
+    vertical +1/-1 deltas and a whole column is computed with a handful of
+    integer operations.
+
+    :param masks: pattern match masks from _build_masks
+    :param m: pattern length
+    :param t: text string
+
+    :return: int:ld
+    """
+
+    if m == 0:
+        return len(t)
+
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    vp = full
+    vn = 0
+    score = m
+
+    for ch in t:
+        eq = masks.get(ch, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | (~(xh | vp) & full)
+        hn = vp & xh
+
+        # track the value of the bottom cell of the column
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+
+        # top row of the matrix grows by one per column, so shift in a 1
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(xv | hp) & full)
+        vn = hp & xv
+
+    return score
+
+
+def _myers_bounded(masks, m, t, k):
+    """
+    Same as _myers_distance but gives up as soon as the LD is known to be
+    larger than k.  The bottom cell can drop by at most 1 per remaining text
+    character, so once score - remaining > k the final LD must exceed k.
+
+    :param masks: pattern match masks from _build_masks
+    :param m: pattern length
+    :param t: text string
+    :param k: max distance of interest
+
+    :return: int:ld, or k + 1 if the LD is larger than k
+    """
+
+    if m == 0:
+        return len(t) if len(t) <= k else k + 1
+
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    vp = full
+    vn = 0
+    score = m
+    limit = k + len(t)
+
+    for pos, ch in enumerate(t, 1):
+        eq = masks.get(ch, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | (~(xh | vp) & full)
+        hn = vp & xh
+
+        if hp & last:
+            score += 1
+            # score - (len(t) - pos) > k
+            if score + pos > limit:
+                return k + 1
+        elif hn & last:
+            score -= 1
+
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(xv | hp) & full)
+        vn = hp & xv
+
+    return score if score <= k else k + 1
+
+
+def _lcs_length(masks, m, t):
+    """
+    Length of the longest common subsequence of a pattern of length m
+    (described by its match masks) and t, with the bit-parallel algorithm of
+    Allison and Dix / Hyyro.  Bit i of v is cleared once pattern position i
+    is matched.
+
+    :param masks: pattern match masks from _build_masks
+    :param m: pattern length
+    :param t: text string
+
+    :return: int:lcs
+    """
+
+    full = (1 << m) - 1
+    v = full
+    for ch in t:
+        u = v & masks.get(ch, 0)
+        v = ((v + u) | (v - u)) & full
+    return m - bin(v).count("1")
+
+
+def find_lcs_length(s, t):
+    """
+    Calculate the length of the longest common subsequence of s and t with
+    the bit-parallel engine.  With a sub cost of at least delete + insert a
+    substitution never pays off, so the LD comes straight from the LCS:
+    d * (len(s) - lcs) + i * (len(t) - lcs).  calc_ratio uses this.
+
+    :param s: source string
+    :param t: target string
+
+    :return: int:lcs
+    """
+
+    total = len(s)
+    s, t = _strip_affix(s, t)
+    common = total - len(s)
     if len(s) < len(t):
-        return find_ld(t, s)
+        s, t = t, s
+    return common + _lcs_length(_build_masks(t), len(t), s)
 
-    # null inputs
-    if len(t) == 0:
-        return len(s), []
 
-    rows = len(s) + 1
-    cols = len(t) + 1
-    row = rows
-    col = cols
+def find_ld_bitparallel(s, t):
+    """
+    Calculate the unit cost LD (costs (1, 1, 1)) between s and t with the
+    bit-parallel engine.  The shorter string is the pattern; Python's
+    arbitrary precision integers hold patterns of any length, splitting them
+    into machine words internally, so a long pattern costs a few multi-word
+    integer operations per character of the text instead of one Python step
+    per matrix cell.
 
-    # get costs from input tuple
-    d_cost, i_cost, s_cost = c
+    :param s: source string
+    :param t: target string
 
-    # setup blank matrices to hold distances and operations
-    dist = [[0 for x in range(cols)] for x in range(rows)]
+    :return: int:ld
+    """
 
-    # setup delete costs
-    for row in range(1, rows):
-        dist[row][0] = row * d_cost
+    s, t = _strip_affix(s, t)
+    if len(s) < len(t):
+        s, t = t, s
+    return _myers_distance(_build_masks(t), len(t), s)
 
-    # setup insert costs
-    for col in range(1, cols):
-        dist[0][col] = col * i_cost
 
-    # print initial matrix
-    if verbose == 2:
-        print()
-        print("Initial Matrix:")
-        print_matrix(s, t, dist)
+def find_ld_bounded(s, t, k, c=(1, 1, 1)):
+    """
+    Answer "is the LD <= k?" without filling the whole matrix.  Only the
+    cells that can still lie on a path of cost <= k are computed (the
+    Ukkonen diagonal band, at most 2k+1 cells wide for unit costs) and the
+    calculation stops as soon as a whole band row is over k.
 
-    for col in range(1, cols):
-        for row in range(1, rows):
+    :param s: source string
+    :param t: target string
+    :param k: max distance of interest
+    :param c: cost tuple [delete, insert, sub]
 
-            if verbose == 2:
-                print(pos_str.format(str(row), str(col)))
-                print(let_str.format(str(s[row - 1]), str(t[col - 1])))
+    :return: int:ld, or k + 1 if the LD is larger than k
 
-            # determine costs
-            del_cost = dist[row - 1][col] + d_cost
-            if verbose == 2:
-                print(cst_str.format("delete", str(row - 1), str(col), str(d_cost), str(del_cost)))
+        Diagonal q holds the cells (row, col) with col - row == q.  Every
+        path starts on diagonal 0 and ends on diagonal delta = len(t) - len(s);
+        moving one diagonal to the right is an insert and one to the left a
+        delete.  A path touching diagonal q therefore costs at least
+            q * i + (q - delta) * d       for q >= max(0, delta)
+            -q * d + (delta - q) * i      for q <= min(0, delta)
+        and only diagonals where that bound is <= k make up the band.
+    """
 
-            ins_cost = dist[row][col - 1] + i_cost
-            if verbose == 2:
-                print(cst_str.format("insert", str(row), str(col - 1), str(i_cost), str(ins_cost)))
+    d_cost, i_cost, s_cost = c
+    big = k + 1
+
+    if k < 0:
+        return big
+
+    s, t = _strip_affix(s, t)
+    rows = len(s)
+    cols = len(t)
+    delta = cols - rows
+
+    # length difference alone is already too expensive
+    if (delta > 0 and delta * i_cost > k) or (delta < 0 and -delta * d_cost > k):
+        return big
+
+    if tuple(c) == (1, 1, 1):
+        if rows < cols:
+            s, t = t, s
+        return _myers_bounded(_build_masks(t), len(t), s, k)
+
+    # no substitutions (e.g. calc_ratio), the exact LCS is cheaper than the band
+    if s_cost >= d_cost + i_cost:
+        lcs = find_lcs_length(s, t)
+        ld = d_cost * (rows - lcs) + i_cost * (cols - lcs)
+        return ld if ld <= k else big
+
+    # band limits, as diagonal offsets col - row
+    indel = d_cost + i_cost
+    if indel > 0:
+        q_max = min(cols, int((k + delta * d_cost) // indel))
+        q_min = max(-rows, -int((k - delta * i_cost) // indel))
+    else:
+        q_max = cols
+        q_min = -rows
+
+    # cells outside the band hold big; anything derived from them is > k
+    row_v = [big] * (cols + 1)
+    prev_hi = min(cols, q_max)
+    for col in range(prev_hi + 1):
+        row_v[col] = col * i_cost
+
+    for row in range(1, rows + 1):
+        lo = max(0, row + q_min)
+        hi = min(cols, row + q_max)
+        s_char = s[row - 1]
+
+        diag = row_v[lo - 1] if lo > 0 else row_v[0]
+        if lo == 0:
+            left = row_v[0] = row * d_cost
+            lo = 1
+        else:
+            left = big
+        row_min = left
 
-            # sub cost could be 0 if letters are the same
-            if s[row - 1] == t[col - 1]:
-                sub_cost = dist[row - 1][col - 1] + 0
-                if verbose == 2:
-                    print(cst_str.format("substitute (no change)", str(row - 1), str(col - 1), "0", str(sub_cost)))
+        for col in range(lo, hi + 1):
+            above = row_v[col] if col <= prev_hi else big
+
+            if s_char == t[col - 1]:
+                cost = diag
             else:
-                sub_cost = dist[row - 1][col - 1] + s_cost
-                if verbose == 2:
-                    print(cst_str.format("substitute", str(row - 1), str(col - 1), str(s_cost), str(sub_cost)))
+                cost = diag + s_cost
 
-            # determine least costly operation
-            if del_cost == min(del_cost, ins_cost, sub_cost):
-                dist[row][col] = del_cost
-                if verbose == 2:
-                    print(op_str.format('delete', del_cost))
+            if above + d_cost < cost:
+                cost = above + d_cost
+            if left + i_cost < cost:
+                cost = left + i_cost
 
-            elif ins_cost == min(del_cost, ins_cost, sub_cost):
-                dist[row][col] = ins_cost
-                if verbose == 2:
-                    print(op_str.format('insert', ins_cost))
+            diag = above
+            row_v[col] = left = cost
+            if cost < row_min:
+                row_min = cost
 
-            else:
-                # sub_cost == min(del_cost, ins_cost, sub_cost):
-                dist[row][col] = sub_cost
-                if verbose == 2:
-                    print(op_str.format('substitute', sub_cost))
+        # every path crosses this row somewhere inside the band
+        if row_min > k:
+            return big
 
-            # print matrix every iteration is verbose output is on
-            if verbose == 2:
-                print()
-                print_matrix(s, t, dist)
+        prev_hi = hi
 
-    return dist[row][col], dist
+    return row_v[cols] if row_v[cols] <= k else big
 
 
-def calc_ratio(s, t):
+class ApproxSearch(object):
+    """
+    Find every place a pattern occurs in a text with at most k edits, with
+    the text fed in chunks (approximate string matching).
+
+        search = ApproxSearch("error", 1)
+        search.feed("an eror in ")     -> [(7, 1)]
+        search.feed("the error log")   -> [(19, 1), (20, 0), (21, 1)]
+
+    This is the LD matrix of the pattern against the text with a top row of
+    zeros, so a match may start anywhere (Sellers' algorithm).  The bottom
+    cell of each column is the fewest edits of any match ending there.  Unit
+    costs use the bit-parallel engine (see _myers_distance, with a 0 shifted
+    into the top row instead of a 1); other costs keep one column of the
+    matrix.  Either way only one column is held between chunks, so memory
+    does not depend on the length of the text.
+    """
 
-    # when calculating the ratio the cost of a sub=2
-    # think of it is delete + insert
-    dist, m = find_ld(s, t, [1, 1, 2])
-    ratio = ((len(s) + len(t)) - dist) / (len(s) + len(t))
-    return ratio
+    def __init__(self, pattern, k, c=(1, 1, 1)):
+        """
+        :param pattern: string (or bytes, or sequence) to look for
+        :param k: max distance of a match
+        :param c: cost tuple [delete, insert, sub] for transforming the
+                  pattern into the matched text
+        """
+
+        if not len(pattern):
+            raise ValueError("empty pattern")
+
+        self.pattern = pattern
+        self.k = k
+        self.costs = tuple(c)
+        self.offset = 0
+        self._masks = None
+        self._start()
+
+    def _start(self):
+        """
+        Set up the first column: the pattern against no text.
+        """
+
+        self._m = len(self.pattern)
+        if self.costs == (1, 1, 1):
+            self._vp = (1 << self._m) - 1
+            self._vn = 0
+            self._score = self._m
+            self._column = None
+        else:
+            self._column = [row * self.costs[0] for row in range(self._m + 1)]
+
+    def feed(self, chunk):
+        """
+        Search the next piece of the text.
+
+        :param chunk: text following everything fed before.  A str pattern
+                      is encoded as UTF-8 for bytes chunks.
+
+        :return: list of (end_offset, distance) tuples: the match ends just
+                 before text position end_offset and is distance edits
+                 away from the pattern
+        """
+
+        if self._masks is None:
+            if isinstance(self.pattern, str) and isinstance(chunk, (bytes, bytearray, memoryview)):
+                self.pattern = self.pattern.encode("utf-8")
+                self._start()
+            self._masks = _build_masks(self.pattern)
+
+        if self._column is None:
+            return self._feed_unit(chunk)
+        return self._feed_costs(chunk)
+
+    def _feed_unit(self, chunk):
+        """
+        feed() for unit costs.
+        """
+
+        masks = self._masks
+        k = self.k
+        full = (1 << self._m) - 1
+        last = 1 << (self._m - 1)
+        vp = self._vp
+        vn = self._vn
+        score = self._score
+        found = []
+
+        for pos, ch in enumerate(chunk, self.offset + 1):
+            eq = masks.get(ch, 0)
+            xv = eq | vn
+            xh = (((eq & vp) + vp) ^ vp) | eq
+            hp = vn | (~(xh | vp) & full)
+            hn = vp & xh
+
+            if hp & last:
+                score += 1
+            elif hn & last:
+                score -= 1
+            if score <= k:
+                found.append((pos, score))
+
+            # the top row stays 0, so shift in a 0
+            hp = (hp << 1) & full
+            hn = (hn << 1) & full
+            vp = hn | (~(xv | hp) & full)
+            vn = hp & xv
+
+        self._vp = vp
+        self._vn = vn
+        self._score = score
+        self.offset += len(chunk)
+        return found
+
+    def _feed_costs(self, chunk):
+        """
+        feed() for other costs.
+        """
+
+        d_cost, i_cost, s_cost = self.costs
+        p = self.pattern
+        k = self.k
+        col_v = self._column
+        rows = len(col_v)
+        found = []
+
+        for pos, ch in enumerate(chunk, self.offset + 1):
+            diag = col_v[0]
+            above = 0
+            for row in range(1, rows):
+                left = col_v[row]
+                if p[row - 1] == ch:
+                    cost = diag
+                else:
+                    cost = diag + s_cost
+                if left + i_cost < cost:
+                    cost = left + i_cost
+                if above + d_cost < cost:
+                    cost = above + d_cost
+                diag = left
+                col_v[row] = above = cost
+            col_v[0] = 0
 
+            if above <= k:
+                found.append((pos, above))
 
-# #### MAIN ####
-print()
-print("Demonstrate computation of Levenshtein Distance (LD) between two words.")
-print("Determine the minimum number of edits to transform source word into target word.")
-print("For example, how many substitutions, insertions, or deletions are required to")
-print("turn 'house' into 'home'?  (Answer: 2), or Democrat into Republican (Answer: 8).")
-print()
-print("The default cost for all edit operations is 1.")
-print()
-print("Debug:  0 = return only the LD")
-print("        1 = return LD plus distance, minimum path, and operations matrices")
-print("        2 = return all intermediate matrices and computations (i.e., lots of output")
-print()
-print("Other fun examples:")
-print("  abc       -> xyz  LD: 3")
-print("  kitten    -> sitting  LD: 3")
-print("  intention -> execution  LD: 5")
-print("  manahaton -> manhattan  LD 3")
-print("  00101010  -> 110110  LD: 3")
-print()
-
-# get user inputs
-source, target, verbose = get_user_input()
-
-# setup the costs tuple
-costs = [int(_del_cost), int(_ins_cost), int(_sub_cost)]
-
-# keep shape of matrix consistent
-if len(source) < len(target):
-    temp = source
-    source = target
-    target = temp
-    print("* switching source and target words to maintain matrix shape *")
-
-# calculate Levenshtein distance
-ld, dist_m = find_ld(source, target, costs)
-
-# calculate the Levenshtein similarity ratio
-# ((len(s) + len(t)) - LD) / (len(s) + len(t))
-lev_ratio = calc_ratio(source, target)
-
-# print results
-if verbose > 0:
-
-    # navigate results matrix to find minimum path
-    min_m = find_min_path(source, target, dist_m)
-
-    # build operations matrix
-    ws, ops_m = build_ops_matrix_and_ws(source, target, min_m)
+        self.offset += len(chunk)
+        return found
 
-    print()
-    print("***** FINAL RESULTS *****")
-    print()
-    print("Final Distance Matrix:")
-    print_matrix(source, target, dist_m)
-    print()
 
-    print("Minimum Path Matrix: ")
-    print_matrix(source, target, min_m)
-    print()
+def find_approx(pattern, text, k, c=(1, 1, 1), chunk_size=1 << 16):
+    """
+    Find every place a pattern occurs in a text with at most k edits (see
+    ApproxSearch).
 
-    print("Final Operations Matrix:")
-    print_matrix(source, target, ops_m)
-    print()
+        list(find_approx("error", open("app.log", "rb"), 1))
+
+    :param pattern: string to look for
+    :param text: string, bytes, file object (read in chunk_size pieces) or
+                 iterable of chunks, e.g. the lines of a file
+    :param k: max distance of a match
+    :param c: cost tuple [delete, insert, sub]
+    :param chunk_size: read size for file objects and long strings
+
+    :return: generator of (end_offset, distance) tuples, see ApproxSearch.feed
+    """
+
+    search = ApproxSearch(pattern, k, c)
 
-    print("Sequential Edits:")
-    for s in ws:
-        print(s)
+    if hasattr(text, "read"):
+        chunks = iter(lambda: text.read(chunk_size), text.read(0))
+    elif isinstance(text, (str, bytes, bytearray)):
+        chunks = (text[pos:pos + chunk_size] for pos in range(0, len(text), chunk_size))
+    else:
+        chunks = text
+
+    for chunk in chunks:
+        for match in search.feed(chunk):
+            yield match
+
+
+def _last_row(s, t, c):
+    """
+    Calculate the last row of the LD matrix of s and t, keeping one row in
+    memory.
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
 
-print()
-print("Levenshtein Distance (LD) between '" + source + "' and '" + target + "' is: " + str(ld))
-print("Levenshtein similarity ratio is: " + str(lev_ratio))
-print()
+    :return: list:row
+    """
+
+    d_cost, i_cost, s_cost = c
+    row_v = [col * i_cost for col in range(len(t) + 1)]
+
+    for row in range(1, len(s) + 1):
+        s_char = s[row - 1]
+        diag = row_v[0]
+        left = row_v[0] = row * d_cost
+
+        for col in range(1, len(t) + 1):
+            above = row_v[col]
+            if s_char == t[col - 1]:
+                cost = diag
+            else:
+                cost = diag + s_cost
+            if above + d_cost < cost:
+                cost = above + d_cost
+            if left + i_cost < cost:
+                cost = left + i_cost
+            diag = above
+            row_v[col] = left = cost
+
+    return row_v
+
+
+def _align_small(s, t, c, s_off, t_off):
+    """
+    Align s and t with a full matrix and a traceback.  Only used by
+    _hirschberg once one of the strings is down to a single character, so the
+    matrix is linear in size.
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+    :param s_off: position of s in the original source string
+    :param t_off: position of t in the original target string
+
+    :return: list:edit operations
+    """
+
+    d_cost, i_cost, s_cost = c
+    rows = len(s) + 1
+    cols = len(t) + 1
+
+    dist = [[0] * cols for x in range(rows)]
+    for row in range(1, rows):
+        dist[row][0] = row * d_cost
+    for col in range(1, cols):
+        dist[0][col] = col * i_cost
+    for row in range(1, rows):
+        for col in range(1, cols):
+            sub = 0 if s[row - 1] == t[col - 1] else s_cost
+            dist[row][col] = min(dist[row - 1][col] + d_cost,
+                                 dist[row][col - 1] + i_cost,
+                                 dist[row - 1][col - 1] + sub)
+
+    # walk back from the corner, preferring the diagonal
+    row = rows - 1
+    col = cols - 1
+    steps = []
+    while row > 0 or col > 0:
+        if row > 0 and col > 0:
+            same = s[row - 1] == t[col - 1]
+            if dist[row][col] == dist[row - 1][col - 1] + (0 if same else s_cost):
+                row -= 1
+                col -= 1
+                steps.append(("M" if same else "S", s_off + row, t_off + col, t[col]))
+                continue
+        if row > 0 and dist[row][col] == dist[row - 1][col] + d_cost:
+            row -= 1
+            steps.append(("D", s_off + row, t_off + col, s[row]))
+        else:
+            col -= 1
+            steps.append(("I", s_off + row, t_off + col, t[col]))
+
+    steps.reverse()
+    return steps
+
+
+def _hirschberg(s, t, c, s_off, t_off):
+    """
+    Hirschberg's divide and conquer alignment.  The source is split in half;
+    the last row of the forward matrix for the top half and of the reversed
+    matrix for the bottom half give the column where the optimal path crosses
+    the middle row.  Both halves are then aligned in turn, so only O(len(t))
+    memory is ever held, and the operations come out in order as each piece
+    is solved.
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+    :param s_off: position of s in the original source string
+    :param t_off: position of t in the original target string
+
+    :return: generator of edit operations
+    """
+
+    # pieces still to align, the next one on top
+    stack = [(s, t, s_off, t_off)]
+    while stack:
+        s, t, s_off, t_off = stack.pop()
+        if len(s) <= 1 or len(t) <= 1:
+            for op in _align_small(s, t, c, s_off, t_off):
+                yield op
+            continue
+
+        mid = len(s) // 2
+        fwd = _last_row(s[:mid], t, c)
+        rev = _last_row(s[mid:][::-1], t[::-1], c)
+
+        cols = len(t)
+        split = 0
+        best = fwd[0] + rev[cols]
+        for col in range(1, cols + 1):
+            cost = fwd[col] + rev[cols - col]
+            if cost < best:
+                best = cost
+                split = col
+
+        stack.append((s[mid:], t[split:], s_off + mid, t_off + split))
+        stack.append((s[:mid], t[:split], s_off, t_off))
+
+
+def find_edit_ops(s, t, c=(1, 1, 1)):
+    """
+    Find the edit operations that transform s into t in linear space
+    (Hirschberg's algorithm).  No cost, path or operations matrix is built,
+    which makes this the way to get an edit script for long strings; the
+    matrices are only needed for the step-by-step display.
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+
+    :return: int:ld, list:ops
+
+        Each operation is a tuple (op, src_pos, dst_pos, char) where op is
+            "M" no-operation (letters are the same)
+            "S" substitute s[src_pos] with t[dst_pos] == char
+            "D" delete s[src_pos] == char
+            "I" insert t[dst_pos] == char
+        src_pos and dst_pos are the positions in s and t before the operation.
+    """
+
+    if _cache is not None:
+        key = _cache_key("find_edit_ops", s, t, c, symmetric=False)
+        result = _cache.get(key)
+        if result is None:
+            ld, ops = _find_edit_ops(s, t, c)
+            result = ld, tuple(ops)
+            _cache.put(key, result)
+        return result[0], list(result[1])
+    return _find_edit_ops(s, t, c)
+
+
+def _find_edit_ops(s, t, c):
+    """
+    Uncached find_edit_ops.
+    """
+
+    d_cost, i_cost, s_cost = c
+
+    ops = list(iter_edit_ops(s, t, c))
+    ld = 0
+    for op in ops:
+        if op[0] == "S":
+            ld += s_cost
+        elif op[0] == "D":
+            ld += d_cost
+        elif op[0] == "I":
+            ld += i_cost
+
+    return ld, ops
+
+
+def iter_edit_ops(s, t, c=(1, 1, 1)):
+    """
+    Generate the edit operations of find_edit_ops one at a time, in order.
+    Each part of the alignment is only worked out when the operations
+    before it have been taken, and nothing but the current piece of the
+    strings is held, so long records can be diffed without keeping the
+    script (let alone a copy of the string per step) in memory.
+
+        for op, src_pos, dst_pos, char in iter_edit_ops("lawn", "flaw"):
+            ...
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+
+    :return: generator of (op, src_pos, dst_pos, char) tuples, see
+             find_edit_ops
+    """
+
+    # matching ends are always part of an optimal alignment
+    limit = min(len(s), len(t))
+    pre = 0
+    while pre < limit and s[pre] == t[pre]:
+        pre += 1
+    suf = 0
+    while suf < limit - pre and s[-1 - suf] == t[-1 - suf]:
+        suf += 1
+
+    for pos in range(pre):
+        yield "M", pos, pos, t[pos]
+    for op in _hirschberg(s[pre:len(s) - suf], t[pre:len(t) - suf], c, pre, pre):
+        yield op
+    s_end = len(s) - suf
+    t_end = len(t) - suf
+    for pos in range(suf):
+        yield "M", s_end + pos, t_end + pos, t[t_end + pos]
+
+
+def get_opcodes(s, t, c=(1, 1, 1), ops=None):
+    """
+    Describe how to turn s into t in the style of
+    difflib.SequenceMatcher.get_opcodes: runs of matching letters become one
+    "equal" opcode, and the edits between two runs one "replace", "delete"
+    or "insert" opcode.
+
+        get_opcodes("lawn", "flaw")
+            -> [('insert', 0, 0, 0, 1), ('equal', 0, 3, 1, 4), ('delete', 3, 4, 4, 4)]
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+    :param ops: edit operations of s and t if already found (see
+                iter_edit_ops), defaults to None
+
+    :return: list of (tag, i1, i2, j1, j2) tuples; s[i1:i2] turns into t[j1:j2]
+    """
+
+    if ops is None:
+        ops = iter_edit_ops(s, t, c)
+
+    opcodes = []
+    # start of the current run, and whether it is a run of matches
+    i1 = j1 = 0
+    equal = None
+    # what the edits of the current run do: D, I or anything else (replace)
+    kinds = set()
+    for op, src_pos, dst_pos, char in ops:
+        same = op == "M"
+        if same != equal:
+            if equal is not None and (src_pos > i1 or dst_pos > j1):
+                opcodes.append((_opcode_tag(equal, kinds), i1, src_pos, j1, dst_pos))
+            i1, j1, equal = src_pos, dst_pos, same
+            kinds = set()
+        kinds.add(op)
+
+    i2, j2 = len(s), len(t)
+    if equal is not None and (i2 > i1 or j2 > j1):
+        opcodes.append((_opcode_tag(equal, kinds), i1, i2, j1, j2))
+    return opcodes
+
+
+def _opcode_tag(equal, kinds):
+    """
+    Opcode tag of a run of edit operations, see get_opcodes.
+    """
+
+    if equal:
+        return "equal"
+    if kinds == set("D"):
+        return "delete"
+    if kinds == set("I"):
+        return "insert"
+    return "replace"
+
+
+def apply_edits(s, ops):
+    """
+    Rebuild the target string from the source and its edit operations (see
+    iter_edit_ops), in one pass.
+
+    :param s: source string (or sequence)
+    :param ops: iterable of (op, src_pos, dst_pos, char) tuples
+
+    :return: str:target, or a sequence of the same type as s
+    """
+
+    parts = []
+    pos = 0
+    for op, src_pos, dst_pos, char in ops:
+        if src_pos != pos:
+            raise ValueError("edit operation {} expected at source position {}, got {}".format(
+                repr(op), pos, src_pos))
+        if op == "M":
+            parts.append(s[pos])
+            pos += 1
+        elif op == "S":
+            parts.append(char)
+            pos += 1
+        elif op == "D":
+            pos += 1
+        elif op == "I":
+            parts.append(char)
+        else:
+            raise ValueError("unknown edit operation: " + repr(op))
+
+    if pos != len(s):
+        raise ValueError("edit operations end at source position {} of {}".format(pos, len(s)))
+    if isinstance(s, str):
+        return "".join(parts)
+    if isinstance(s, array):
+        return array(s.typecode, parts)
+    return type(s)(parts)
+
+
+class CompiledQuery(object):
+    """
+    A query string prepared for comparing against many other strings, see
+    compile().  The pattern masks (or, for weighted costs, the first matrix
+    row) are built once.  Per comparison only the common prefix and suffix
+    with the other string are found; the masks of what is left of the query
+    are the full masks shifted and cut down, so they are never rebuilt from
+    the characters.
+    """
+
+    def __init__(self, query, c=(1, 1, 1)):
+        """
+        :param query: source string
+        :param c: cost tuple [delete, insert, sub]
+        """
+
+        self.query = query
+        self.costs = tuple(c)
+        self._m = len(query)
+        self._masks = _build_masks(query)
+        self._unit = self.costs == (1, 1, 1)
+        self._indel = c[2] >= c[0] + c[1]
+        self._first_row = [col * c[0] for col in range(self._m + 1)]
+
+    def __len__(self):
+        return self._m
+
+    def _strip(self, other):
+        """
+        Find the common prefix and suffix of the query and other.
+
+        :param other: target string
+
+        :return: int:prefix length, int:suffix length
+        """
+
+        q = self.query
+        limit = min(self._m, len(other))
+        pre = 0
+        while pre < limit and q[pre] == other[pre]:
+            pre += 1
+        suf = 0
+        while suf < limit - pre and q[-1 - suf] == other[-1 - suf]:
+            suf += 1
+        return pre, suf
+
+    def _masks_for(self, pre, suf):
+        """
+        Pattern masks of the query without its first pre and last suf
+        characters.
+
+        :param pre: prefix length
+        :param suf: suffix length
+
+        :return: dict:masks
+        """
+
+        if not pre and not suf:
+            return self._masks
+
+        full = (1 << (self._m - pre - suf)) - 1
+        masks = {}
+        for ch, mask in self._masks.items():
+            mask = (mask >> pre) & full
+            if mask:
+                masks[ch] = mask
+        return masks
+
+    def distance(self, other, max_distance=None):
+        """
+        Calculate the LD from the query to other.
+
+        :param other: target string
+        :param max_distance: if given, stop as soon as the LD is known to be
+                             larger (see find_ld_bounded)
+
+        :return: int:ld, or max_distance + 1 if the LD is larger
+        """
+
+        d_cost, i_cost, s_cost = self.costs
+
+        if max_distance is not None:
+            delta = len(other) - self._m
+            if (delta > 0 and delta * i_cost > max_distance) or (delta < 0 and -delta * d_cost > max_distance):
+                return max_distance + 1
+
+        pre, suf = self._strip(other)
+        m = self._m - pre - suf
+        text = other[pre:len(other) - suf]
+
+        if self._unit:
+            if max_distance is not None:
+                return _myers_bounded(self._masks_for(pre, suf), m, text, max_distance)
+            return _myers_distance(self._masks_for(pre, suf), m, text)
+
+        if self._indel:
+            lcs = _lcs_length(self._masks_for(pre, suf), m, text)
+            ld = d_cost * (m - lcs) + i_cost * (len(text) - lcs)
+            if max_distance is not None and ld > max_distance:
+                return max_distance + 1
+            return ld
+
+        # keep the row along the query; other runs down the side, so
+        # delete and insert swap roles
+        q = self.query[pre:self._m - suf]
+        if max_distance is not None:
+            return self._banded(q, text, max_distance)
+
+        row_v = self._first_row[:m + 1]
+        for row in range(1, len(text) + 1):
+            o_char = text[row - 1]
+            diag = row_v[0]
+            left = row_v[0] = row * i_cost
+            for col in range(1, m + 1):
+                above = row_v[col]
+                if o_char == q[col - 1]:
+                    cost = diag
+                else:
+                    cost = diag + s_cost
+                if above + i_cost < cost:
+                    cost = above + i_cost
+                if left + d_cost < cost:
+                    cost = left + d_cost
+                diag = above
+                row_v[col] = left = cost
+
+        return row_v[-1]
+
+    def _banded(self, q, text, k):
+        """
+        The row loop of distance(), cut down to the diagonal band of cells
+        that can still lie on a path of cost <= k, see find_ld_bounded.  The
+        row runs along the query, so moving right is a delete and moving
+        down an insert.
+
+        :param q: query without the common prefix and suffix
+        :param text: other string without the common prefix and suffix
+        :param k: max distance
+
+        :return: int:ld, or k + 1 if the LD is larger than k
+        """
+
+        d_cost, i_cost, s_cost = self.costs
+        big = k + 1
+
+        if k < 0:
+            return big
+
+        m = len(q)
+        rows = len(text)
+        delta = m - rows
+
+        # band limits, as diagonal offsets col - row
+        indel = d_cost + i_cost
+        if indel > 0:
+            q_max = min(m, int((k + delta * i_cost) // indel))
+            q_min = max(-rows, -int((k - delta * d_cost) // indel))
+        else:
+            q_max = m
+            q_min = -rows
+
+        # cells outside the band hold big; anything derived from them is > k
+        row_v = [big] * (m + 1)
+        prev_hi = q_max
+        row_v[:prev_hi + 1] = self._first_row[:prev_hi + 1]
+
+        for row in range(1, rows + 1):
+            lo = max(0, row + q_min)
+            hi = min(m, row + q_max)
+            o_char = text[row - 1]
+
+            diag = row_v[lo - 1] if lo > 0 else row_v[0]
+            if lo == 0:
+                left = row_v[0] = row * i_cost
+                lo = 1
+            else:
+                left = big
+            row_min = left
+
+            for col in range(lo, hi + 1):
+                above = row_v[col] if col <= prev_hi else big
+
+                if o_char == q[col - 1]:
+                    cost = diag
+                else:
+                    cost = diag + s_cost
+
+                if above + i_cost < cost:
+                    cost = above + i_cost
+                if left + d_cost < cost:
+                    cost = left + d_cost
+
+                diag = above
+                row_v[col] = left = cost
+                if cost < row_min:
+                    row_min = cost
+
+            # every path crosses this row somewhere inside the band
+            if row_min > k:
+                return big
+
+            prev_hi = hi
+
+        return row_v[m] if row_v[m] <= k else big
+
+    def ratio(self, other):
+        """
+        Calculate the similarity ratio of the query and other (see calc_ratio).
+
+        :param other: target string
+
+        :return: float:ratio
+        """
+
+        total = self._m + len(other)
+        if not total:
+            return 1.0
+
+        pre, suf = self._strip(other)
+        m = self._m - pre - suf
+        text = other[pre:len(other) - suf]
+        lcs = _lcs_length(self._masks_for(pre, suf), m, text)
+        return (total - (m + len(text) - 2 * lcs)) / total
+
+    def within(self, other, k):
+        """
+        Find out whether the LD from the query to other is at most k.
+
+        :param other: target string
+        :param k: max distance
+
+        :return: bool
+        """
+
+        return self.distance(other, k) <= k
+
+
+def compile(query, c=(1, 1, 1)):
+    """
+    Prepare a query string for comparing against many other strings.
+
+        q = compile("kitten")
+        q.distance("sitting")     -> 3
+        q.within("sitting", 2)    -> False
+
+    :param query: source string
+    :param c: cost tuple [delete, insert, sub]
+
+    :return: CompiledQuery:query
+    """
+
+    return CompiledQuery(query, c)
+
+
+def _numpy():
+    """
+    Import numpy on first use.
+
+    :return: module:numpy, or None if numpy is not installed
+    """
+
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = False
+    return _np or None
+
+
+def _distances_row(query, choices, c, typecode):
+    """
+    Calculate the LD from query to each of the choices, compiling the query
+    once (see compile()).
+
+    :param query: source string
+    :param choices: sequence of target strings
+    :param c: cost tuple [delete, insert, sub]
+    :param typecode: array typecode of the result (see _distances_typecode)
+
+    :return: array:distances
+    """
+
+    out = array(typecode, [0]) * len(choices)
+
+    distance = compile(query, c).distance
+    for pos, choice in enumerate(choices):
+        out[pos] = distance(choice)
+    return out
+
+
+def _distances_typecode(queries, choices, c):
+    """
+    Pick the array typecode of the distances between queries and choices,
+    large enough for any of them (see _cell_typecode).
+
+    :param queries: list of source strings
+    :param choices: list of target strings
+    :param c: cost tuple [delete, insert, sub]
+
+    :return: str:typecode
+    """
+
+    return _cell_typecode(max([len(x) for x in queries] or [0]), max([len(x) for x in choices] or [0]), c)
+
+
+def _pool_init(choices):
+    """
+    Worker process initializer: keep the choices so they are only sent once.
+
+    :param choices: list of target strings
+    """
+
+    global _pool_choices
+    _pool_choices = choices
+
+
+def _pool_row(args):
+    """
+    Worker process task: distances from a query to a slice of the choices.
+
+    :param args: tuple (query, costs, start, stop, typecode)
+
+    :return: array:distances
+    """
+
+    query, c, start, stop, typecode = args
+    return _distances_row(query, _pool_choices[start:stop], c, typecode)
+
+
+def _run_pool(tasks, choices, workers):
+    """
+    Run _pool_row tasks in a process pool.
+
+    :param tasks: list of (query, costs, start, stop, typecode) tuples
+    :param choices: list of target strings
+    :param workers: number of worker processes
+
+    :return: list:results in task order
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_pool_init,
+                             initargs=(choices,)) as pool:
+        return list(pool.map(_pool_row, tasks))
+
+
+def distances(query, choices, c=(1, 1, 1), workers=None):
+    """
+    Calculate the LD from one query string to many choices.
+
+    :param query: source string
+    :param choices: iterable of target strings
+    :param c: cost tuple [delete, insert, sub]
+    :param workers: number of worker processes, defaults to None (run here)
+
+    :return: numpy array if numpy is installed, else array('i')
+             (array('q') for distances past 32 bits, array('d') for float
+             costs)
+    """
+
+    choices = list(choices)
+    typecode = _distances_typecode([query], choices, c)
+
+    if workers and workers > 1 and len(choices) > 1:
+        step = -(-len(choices) // (workers * 4))
+        tasks = [(query, c, start, start + step, typecode) for start in range(0, len(choices), step)]
+        parts = _run_pool(tasks, choices, workers)
+        out = parts[0]
+        for part in parts[1:]:
+            out.extend(part)
+    else:
+        out = _distances_row(query, choices, c, typecode)
+
+    np = _numpy()
+    if np is not None:
+        return np.frombuffer(out, dtype={"i": np.int32, "q": np.int64, "d": np.float64}[typecode]).copy()
+    return out
+
+
+def cdist(queries, choices, c=(1, 1, 1), workers=None):
+    """
+    Calculate the LD from every query to every choice.
+
+    :param queries: iterable of source strings
+    :param choices: iterable of target strings
+    :param c: cost tuple [delete, insert, sub]
+    :param workers: number of worker processes, defaults to None (run here).
+                    The rows of the result are split across the workers.
+
+    :return: 2D numpy array if numpy is installed, else a list with one
+             array('i') (array('q') for distances past 32 bits, array('d')
+             for float costs) per query.
+             Either way result[q][c] is the LD from queries[q] to choices[c].
+    """
+
+    queries = list(queries)
+    choices = list(choices)
+    typecode = _distances_typecode(queries, choices, c)
+
+    if workers and workers > 1 and len(queries) > 1:
+        rows = _run_pool([(query, c, 0, len(choices), typecode) for query in queries], choices, workers)
+    else:
+        rows = [_distances_row(query, choices, c, typecode) for query in queries]
+
+    np = _numpy()
+    if np is not None:
+        dtype = {"i": np.int32, "q": np.int64, "d": np.float64}[typecode]
+        out = np.zeros((len(queries), len(choices)), dtype=dtype)
+        for pos, row in enumerate(rows):
+            out[pos] = row
+        return out
+    return rows
+
+
+def _histogram(s):
+    """
+    Count the characters of a string.
+
+    :param s: string
+
+    :return: dict:character counts
+    """
+
+    counts = {}
+    for ch in s:
+        counts[ch] = counts.get(ch, 0) + 1
+    return counts
+
+
+def _surplus(q_counts, choice):
+    """
+    Count the characters choice has more of than the query.
+
+    :param q_counts: character counts of the query (see _histogram)
+    :param choice: target string
+
+    :return: int:surplus
+    """
+
+    surplus = 0
+    for ch, n in _histogram(choice).items():
+        n -= q_counts.get(ch, 0)
+        if n > 0:
+            surplus += n
+    return surplus
+
+
+def _counts_bound(surplus, q_len, choice_len, c):
+    """
+    Lower bound of the LD from a query to a choice from their character
+    counts: every character the choice has more of than the query must be
+    inserted or substituted in, every one it has fewer of deleted or
+    substituted away.  The bound never decreases as surplus grows, so a
+    lower estimate of surplus still gives a valid bound.
+
+    :param surplus: characters the choice has more of (see _surplus)
+    :param q_len: length of the query
+    :param choice_len: length of the choice
+    :param c: cost tuple [delete, insert, sub]
+
+    :return: int:lower bound
+    """
+
+    missing = surplus + q_len - choice_len
+    subs = min(surplus, missing)
+    return min(surplus * c[1] + missing * c[0],
+               subs * c[2] + (surplus - subs) * c[1] + (missing - subs) * c[0])
+
+
+def _ratio_limit(total, score_cutoff, worst):
+    """
+    Largest LD (sub cost 2) at which a pair with total length total still
+    makes it into the results of extract().
+
+    :param total: combined length of the two strings (> 0)
+    :param score_cutoff: lowest ratio to report, or None
+    :param worst: ratio that has to be beaten, or None
+
+    :return: int:max distance, -1 if no distance is good enough
+    """
+
+    def ok(dist):
+        ratio = (total - dist) / total
+        return (score_cutoff is None or ratio >= score_cutoff) and (worst is None or ratio > worst)
+
+    low = 1.0
+    if score_cutoff is not None:
+        low = score_cutoff
+    if worst is not None and worst > low:
+        low = worst
+
+    k = min(total, max(-1, int(total * (1 - low))))
+    while k >= 0 and not ok(k):
+        k -= 1
+    while k < total and ok(k + 1):
+        k += 1
+    return k
+
+
+def extract(query, choices, limit=5, score_cutoff=None, scorer="ratio", c=(1, 1, 1)):
+    """
+    Find the choices most similar to a query.
+
+        extract("lawn", ["flaw", "lawns", "dawn", "xyz"], limit=2)
+            -> [('lawns', 0.888..., 1), ('flaw', 0.75, 0)]
+
+    Gives the same results as scoring every choice with calc_ratio (or
+    find_ld) and sorting, but most choices are ruled out from their length
+    and character counts without running the LD calculation.  Once limit
+    matches are found, a choice also has to beat the worst of them, so the
+    bar rises as better matches turn up.
+
+    :param query: source string
+    :param choices: iterable of target strings
+    :param limit: max number of results, None for all
+    :param score_cutoff: lowest ratio (scorer "ratio") or highest LD
+                         (scorer "distance") to report, None for no limit
+    :param scorer: "ratio" for calc_ratio, or "distance" for the LD
+    :param c: cost tuple [delete, insert, sub] of scorer "distance"
+
+    :return: list of (choice, score, index) tuples, best first; equal scores
+             are ordered by index
+    """
+
+    import heapq
+
+    if scorer not in ("ratio", "distance"):
+        raise ValueError("scorer must be 'ratio' or 'distance', not " + repr(scorer))
+    if limit is not None and limit < 1:
+        return []
+
+    by_ratio = scorer == "ratio"
+    if by_ratio:
+        c = (1, 1, 2)
+    distance = compile(query, c).distance
+    q_len = len(query)
+    q_counts = _histogram(query)
+    # deleting the query's characters leaves the ones it has none of
+    foreign = dict.fromkeys(ord(ch) for ch in q_counts) if isinstance(query, str) else None
+    d_cost, i_cost = c[0], c[1]
+
+    # heap of the matches so far, worst first: (ratio, -index, choice) or
+    # (-distance, -index, choice).  Later choices only replace the worst
+    # one if they score strictly better, as equal scores keep the lower index
+    best = []
+    full = False
+
+    # a choice is kept if its LD is at most k and, for scorer "distance",
+    # below worst.  For the ratio k depends on the length, see _ratio_limit
+    k = None if by_ratio else score_cutoff
+    worst = None
+    limits = {}
+
+    for index, choice in enumerate(choices):
+        c_len = len(choice)
+        if by_ratio:
+            total = q_len + c_len
+            k = limits.get(total)
+            if not total:
+                # two empty strings: ratio 1.0
+                if full and best[0][0] >= 1.0:
+                    continue
+                k = 0
+            elif k is None:
+                k = limits[total] = _ratio_limit(total, score_cutoff, best[0][0] if full else None)
+
+        if k is not None or worst is not None:
+            delta = c_len - q_len
+            bound = delta * i_cost if delta > 0 else -delta * d_cost
+            if (k is not None and bound > k) or (worst is not None and bound >= worst):
+                continue
+            if foreign is not None and isinstance(choice, str):
+                bound = _counts_bound(len(choice.translate(foreign)), q_len, c_len, c)
+                if (k is not None and bound > k) or (worst is not None and bound >= worst):
+                    continue
+            bound = _counts_bound(_surplus(q_counts, choice), q_len, c_len, c)
+            if (k is not None and bound > k) or (worst is not None and bound >= worst):
+                continue
+
+        if by_ratio:
+            dist = distance(choice)
+            if dist > k:
+                continue
+            item = ((total - dist) / total if total else 1.0, -index, choice)
+        else:
+            limit_k = k if worst is None or (k is not None and k < worst) else worst
+            dist = distance(choice, limit_k)
+            if (k is not None and dist > k) or (worst is not None and dist >= worst):
+                continue
+            item = (-dist, -index, choice)
+
+        if full:
+            heapq.heapreplace(best, item)
+        else:
+            heapq.heappush(best, item)
+            full = limit is not None and len(best) >= limit
+        if full:
+            if by_ratio:
+                limits.clear()
+            else:
+                worst = -best[0][0]
+
+    best.sort(reverse=True)
+    if by_ratio:
+        return [(choice, score, -index) for score, index, choice in best]
+    return [(choice, -score, -index) for score, index, choice in best]
+
+
+def _verify_pairs(args):
+    """
+    Check candidate pairs of find_clusters().
+
+    :param args: tuple (list of (s, t, max distance), costs)
+
+    :return: list of bool, True for the pairs within their max distance
+    """
+
+    pairs, c = args
+    return [k >= 0 and find_ld(s, t, c, matrix=False, max_distance=k)[0] <= k for s, t, k in pairs]
+
+
+def find_clusters(records, k=None, ratio=None, q=2, c=(1, 1, 1), workers=None,
+                  sorted_by_length=False, chunk=1024, min_size=2):
+    """
+    Group records into clusters of near duplicates: two records are linked
+    if their LD is at most k (or their calc_ratio at least ratio), and a
+    cluster is everything linked directly or through other records.
+
+        list(find_clusters(["lawn", "flaw", "lawns", "xyz"], k=1))
+            -> [[(0, 'lawn'), (2, 'lawns')]]
+
+    The records are read one chunk at a time.  Each record is looked up in
+    an inverted index of the q-grams of the records before it: a pair
+    within e edits shares at least max(grams) - q * e q-grams, so only
+    records sharing that many are candidates (pairs too short for that
+    bound to say anything are taken from an index by length instead).
+    The candidates are checked with the bounded LD engine, in a process
+    pool when workers > 1, and linked with union-find.  No list of pairs is
+    kept, memory goes to the index and the open clusters.
+
+    With sorted_by_length=True the records must come shortest first.  Once
+    the records get too long to match a record it leaves the index, and a
+    cluster is yielded as soon as all its records have left, so memory stays
+    bounded by the records of about the current length.  Otherwise all
+    clusters are yielded at the end.
+
+    :param records: iterable of strings
+    :param k: max LD of linked records
+    :param ratio: min calc_ratio of linked records, instead of k
+    :param q: q-gram length
+    :param c: cost tuple [delete, insert, sub] for k; delete and insert
+              costs must be equal
+    :param workers: number of worker processes, defaults to None (run here)
+    :param sorted_by_length: True if the records come shortest first
+    :param chunk: records read per step
+    :param min_size: smallest cluster to yield
+
+    :return: generator of clusters, each a list of (index, record) tuples
+             in index order
+    """
+
+    if (k is None) == (ratio is None):
+        raise ValueError("give exactly one of k and ratio")
+    if ratio is None and c[0] != c[1]:
+        raise ValueError("find_clusters needs equal delete and insert costs, got " + str(tuple(c)))
+    if q < 1:
+        raise ValueError("q must be at least 1, got " + str(q))
+
+    import collections
+
+    if ratio is not None:
+        c = (1, 1, 2)
+    elif min(c) > 0:
+        edits = k // min(c)
+    else:
+        # free edits: any number of them fit, so the q-gram bound says nothing
+        edits = float("inf")
+
+    def max_edits(s_len, t_len):
+        # most edits, and max LD, a pair with these lengths can be linked by
+        if ratio is None:
+            return edits, k
+        limit = _ratio_limit(s_len + t_len, ratio, None) if s_len + t_len else 0
+        return limit, limit
+
+    def too_far(s_len, t_len):
+        # the length difference alone rules the pair out
+        diff = abs(s_len - t_len)
+        if ratio is None:
+            return diff * c[0] > k
+        return diff > max_edits(s_len, t_len)[1]
+
+    # index: q-gram -> {id: count}, length -> ids, and the records in it
+    postings = {}
+    by_length = {}
+    records_in = {}
+    order = collections.deque()
+    # union-find: parent, and per root its members and how many are in the index
+    parent = {}
+    members = {}
+    open_count = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a == b:
+            return
+        if len(members[a]) < len(members[b]):
+            a, b = b, a
+        parent[b] = a
+        members[a].extend(members.pop(b))
+        open_count[a] += open_count.pop(b)
+
+    def grams_of(s):
+        counts = {}
+        for pos in range(len(s) - q + 1):
+            g = s[pos:pos + q]
+            counts[g] = counts.get(g, 0) + 1
+        return counts
+
+    def evict(x):
+        s = records_in.pop(x)
+        for g in grams_of(s):
+            bucket = postings[g]
+            del bucket[x]
+            if not bucket:
+                del postings[g]
+        ids = by_length[len(s)]
+        ids.discard(x)
+        if not ids:
+            del by_length[len(s)]
+
+        root = find(x)
+        open_count[root] -= 1
+        if open_count[root]:
+            return None
+        del open_count[root]
+        cluster = members.pop(root)
+        for y, t in cluster:
+            del parent[y]
+        return cluster
+
+    pool = None
+    if workers and workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        records = iter(records)
+        index = 0
+        last_len = 0
+        while True:
+            batch = []
+            for s in records:
+                batch.append(s)
+                if len(batch) >= chunk:
+                    break
+            if not batch:
+                break
+
+            pairs = []
+            for s in batch:
+                s_len = len(s)
+                if sorted_by_length and s_len < last_len:
+                    raise ValueError("records are not sorted by length: record {} is shorter than the one "
+                                     "before".format(index))
+                last_len = s_len
+                grams = grams_of(s)
+                s_grams = max(0, s_len - q + 1)
+
+                # q-grams the candidates of each length must share with s
+                need = {}
+                candidates = set()
+                for t_len in by_length:
+                    if too_far(s_len, t_len):
+                        continue
+                    need[t_len] = max(s_grams, t_len - q + 1) - q * max_edits(s_len, t_len)[0]
+                    if need[t_len] <= 0:
+                        candidates.update(by_length[t_len])
+
+                shared = {}
+                for g, n in grams.items():
+                    for x, m in postings.get(g, {}).items():
+                        shared[x] = shared.get(x, 0) + (n if n < m else m)
+                for x, n in shared.items():
+                    t_need = need.get(len(records_in[x]))
+                    if t_need is not None and 0 < t_need <= n:
+                        candidates.add(x)
+
+                for x in candidates:
+                    t = records_in[x]
+                    pairs.append((x, index, (t, s, max_edits(s_len, len(t))[1])))
+
+                records_in[index] = s
+                for g, n in grams.items():
+                    postings.setdefault(g, {})[index] = n
+                by_length.setdefault(s_len, set()).add(index)
+                order.append(index)
+                parent[index] = index
+                members[index] = [(index, s)]
+                open_count[index] = 1
+                index += 1
+
+            if pairs:
+                tasks = [pair[2] for pair in pairs]
+                if pool is not None:
+                    step = max(64, -(-len(tasks) // (workers * 4)))
+                    parts = pool.map(_verify_pairs, [(tasks[pos:pos + step], c)
+                                                     for pos in range(0, len(tasks), step)])
+                    linked = [ok for part in parts for ok in part]
+                else:
+                    linked = _verify_pairs((tasks, c))
+                for pair, ok in zip(pairs, linked):
+                    if ok:
+                        union(pair[0], pair[1])
+
+            if sorted_by_length:
+                # later records are at least last_len long
+                while order and too_far(last_len, len(records_in[order[0]])):
+                    cluster = evict(order.popleft())
+                    if cluster is not None and len(cluster) >= min_size:
+                        yield sorted(cluster)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    clusters = [members[root] for root in members]
+    clusters.sort(key=min)
+    for cluster in clusters:
+        if len(cluster) >= min_size:
+            yield sorted(cluster)
+
+
+class BKTree(object):
+    """
+    Burkhard-Keller tree over a dictionary of words, for finding all words
+    within a given LD of a query, or the nearest words to it.
+
+    Every child hangs off its parent by its LD to the parent's word.  By the
+    triangle inequality a word within k of the query can only be below an
+    edge labelled d - k .. d + k, where d is the LD from the query to the
+    parent, so most of the tree is never looked at.
+
+    Nodes are stored in parallel lists (word, children) indexed by node
+    number, with children a dict {distance: node} or None for leaves.  That
+    keeps the nodes small and lets the tree pickle without recursion, see
+    save() and load().
+    """
+
+    def __init__(self, words=(), c=(1, 1, 1)):
+        """
+        :param words: iterable of words to insert
+        :param c: cost tuple [delete, insert, sub].  The delete and insert
+                  costs must be equal, otherwise the LD is not symmetric and
+                  the pruning would lose words.
+        """
+
+        if c[0] != c[1]:
+            raise ValueError("BKTree needs equal delete and insert costs, got " + str(tuple(c)))
+
+        self.costs = tuple(c)
+        self._words = []
+        self._children = []
+        for word in words:
+            self.insert(word)
+
+    def __len__(self):
+        return len(self._words)
+
+    def insert(self, word):
+        """
+        Add a word to the tree.  Words already in the tree are ignored.
+
+        :param word: word to add
+
+        :return: bool:True if the word was added
+        """
+
+        if not self._words:
+            self._words.append(word)
+            self._children.append(None)
+            return True
+
+        query = compile(word, self.costs)
+        node = 0
+        while True:
+            dist = query.distance(self._words[node])
+            if dist == 0:
+                return False
+
+            children = self._children[node]
+            if children is None:
+                children = self._children[node] = {}
+
+            child = children.get(dist)
+            if child is None:
+                children[dist] = len(self._words)
+                self._words.append(word)
+                self._children.append(None)
+                return True
+            node = child
+
+    def search(self, word, k):
+        """
+        Find all words within LD k of word.
+
+        :param word: query word
+        :param k: max distance
+
+        :return: list of (word, distance) tuples, closest first
+        """
+
+        found = []
+        if not self._words:
+            return found
+
+        query = compile(word, self.costs)
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            children = self._children[node]
+
+            # the exact distance is only needed up to the farthest child edge
+            limit = k + max(children) if children else k
+            dist = query.distance(self._words[node], limit)
+            if dist <= k:
+                found.append((self._words[node], dist))
+
+            if children:
+                for edge, child in children.items():
+                    if dist - k <= edge <= dist + k:
+                        stack.append(child)
+
+        found.sort(key=lambda x: (x[1], x[0]))
+        return found
+
+    def nearest(self, word, n=1):
+        """
+        Find the n words with the lowest LD to word.
+
+        :param word: query word
+        :param n: number of words to return
+
+        :return: list of (word, distance) tuples, closest first
+        """
+
+        import heapq
+
+        if not self._words or n < 1:
+            return []
+
+        query = compile(word, self.costs)
+
+        # best holds (-distance, word) so the worst match is on top
+        best = []
+        queue = [(0, 0)]
+        while queue:
+            bound, node = heapq.heappop(queue)
+            radius = -best[0][0] if len(best) == n else None
+            if radius is not None and bound > radius:
+                break
+
+            children = self._children[node]
+            if radius is None:
+                dist = query.distance(self._words[node])
+            else:
+                dist = query.distance(self._words[node], radius + max(children) if children else radius)
+
+            if radius is None or dist < radius:
+                heapq.heappush(best, (-dist, self._words[node]))
+                if len(best) > n:
+                    heapq.heappop(best)
+                if len(best) == n:
+                    radius = -best[0][0]
+
+            if children:
+                for edge, child in children.items():
+                    # lower bound on the LD of anything below this edge
+                    child_bound = abs(dist - edge)
+                    if radius is None or child_bound < radius:
+                        heapq.heappush(queue, (child_bound, child))
+
+        return sorted(((x[1], -x[0]) for x in best), key=lambda x: (x[1], x[0]))
+
+    def save(self, path):
+        """
+        Pickle the tree to a file.
+
+        :param path: file name
+        """
+
+        import pickle
+
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a tree written by save().
+
+        :param path: file name
+
+        :return: BKTree:tree
+        """
+
+        import pickle
+
+        with open(path, "rb") as f:
+            tree = pickle.load(f)
+        if not isinstance(tree, cls):
+            raise TypeError(path + " does not hold a " + cls.__name__)
+        return tree
+
+
+class _TrieNode(object):
+    """
+    Trie node.  children is a dict {char: node}, or None for leaves, and word
+    is the word ending at this node (None if no word ends here).
+    """
+
+    __slots__ = ("children", "word")
+
+    def __init__(self):
+        self.children = None
+        self.word = None
+
+
+class Trie(object):
+    """
+    Prefix tree over a dictionary of words, for finding all words within a
+    given LD of a query.
+
+    The lookup walks the trie one letter at a time, computing one row of the
+    LD matrix per letter from the row of the parent node.  Words that share a
+    prefix therefore share the rows for that prefix, and a branch is dropped
+    as soon as the smallest value in its row is over k: rows only grow from
+    there, so nothing below can come back within k.
+    """
+
+    def __init__(self, words=(), c=(1, 1, 1)):
+        """
+        :param words: iterable of words to insert
+        :param c: cost tuple [delete, insert, sub], for transforming the
+                  query into a dictionary word
+        """
+
+        self.costs = tuple(c)
+        self._root = _TrieNode()
+        self._size = 0
+        for word in words:
+            self.insert(word)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, word):
+        node = self._root
+        for ch in word:
+            if node.children is None or ch not in node.children:
+                return False
+            node = node.children[ch]
+        return node.word is not None
+
+    def insert(self, word):
+        """
+        Add a word to the trie.  Words already in the trie are ignored.
+
+        :param word: word to add
+
+        :return: bool:True if the word was added
+        """
+
+        node = self._root
+        for ch in word:
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(ch)
+            if child is None:
+                child = node.children[ch] = _TrieNode()
+            node = child
+
+        if node.word is not None:
+            return False
+        node.word = word
+        self._size += 1
+        return True
+
+    def fuzzy_lookup(self, word, k):
+        """
+        Find all words within LD k of word.
+
+        :param word: query word (source)
+        :param k: max distance
+
+        :return: list of (word, distance) tuples, closest first
+        """
+
+        d_cost, i_cost, s_cost = self.costs
+        cols = len(word) + 1
+        found = []
+
+        # row[col] is the LD from word[:col] to the prefix spelled by the node
+        first_row = [col * d_cost for col in range(cols)]
+        if self._root.word is not None and first_row[-1] <= k:
+            found.append((self._root.word, first_row[-1]))
+        if self._root.children is None or min(first_row) > k:
+            return found
+
+        stack = [(child, ch, first_row) for ch, child in self._root.children.items()]
+        while stack:
+            node, ch, prev = stack.pop()
+
+            row_v = [prev[0] + i_cost]
+            left = row_v[0]
+            row_min = left
+            for col in range(1, cols):
+                if word[col - 1] == ch:
+                    cost = prev[col - 1]
+                else:
+                    cost = prev[col - 1] + s_cost
+                if prev[col] + i_cost < cost:
+                    cost = prev[col] + i_cost
+                if left + d_cost < cost:
+                    cost = left + d_cost
+                row_v.append(cost)
+                left = cost
+                if cost < row_min:
+                    row_min = cost
+
+            if node.word is not None and row_v[-1] <= k:
+                found.append((node.word, row_v[-1]))
+
+            if node.children is not None and row_min <= k:
+                for child_ch, child in node.children.items():
+                    stack.append((child, child_ch, row_v))
+
+        found.sort(key=lambda x: (x[1], x[0]))
+        return found
+
+
+class IncrementalLD(object):
+    """
+    LD from a fixed source string to a target that grows and shrinks at the
+    end, e.g. text being typed.
+
+        inc = IncrementalLD("kitten")
+        inc.extend("sit")
+        inc.distance    -> 4
+        inc.append("t")
+        inc.pop()
+
+    The last column of the LD matrix (one value per source prefix) is kept
+    for every target prefix, so appending a character costs one new column,
+    O(len(source)), and removing one just drops the last column.
+    """
+
+    def __init__(self, source, c=(1, 1, 1)):
+        """
+        :param source: source string
+        :param c: cost tuple [delete, insert, sub]
+        """
+
+        self.source = source
+        self.costs = tuple(c)
+        self._target = []
+        self._columns = [[row * c[0] for row in range(len(source) + 1)]]
+
+    def __len__(self):
+        return len(self._target)
+
+    @property
+    def target(self):
+        """
+        The current target string.
+        """
+
+        return "".join(self._target)
+
+    @property
+    def distance(self):
+        """
+        LD from the source to the current target.
+        """
+
+        return self._columns[-1][-1]
+
+    @property
+    def min(self):
+        """
+        Smallest value of the last column: the LD from the closest prefix of
+        the source to the current target.  It never goes down as the target
+        grows, and the LD to any longer target is at least this.
+        """
+
+        return min(self._columns[-1])
+
+    def append(self, ch):
+        """
+        Add a character to the end of the target.
+
+        :param ch: character
+
+        :return: int:new distance
+        """
+
+        d_cost, i_cost, s_cost = self.costs
+        s = self.source
+        prev = self._columns[-1]
+        col_v = [prev[0] + i_cost]
+        above = col_v[0]
+        for row in range(1, len(prev)):
+            if s[row - 1] == ch:
+                cost = prev[row - 1]
+            else:
+                cost = prev[row - 1] + s_cost
+            if prev[row] + i_cost < cost:
+                cost = prev[row] + i_cost
+            if above + d_cost < cost:
+                cost = above + d_cost
+            col_v.append(cost)
+            above = cost
+
+        self._target.append(ch)
+        self._columns.append(col_v)
+        return col_v[-1]
+
+    def extend(self, text):
+        """
+        Add characters to the end of the target.
+
+        :param text: string
+
+        :return: int:new distance
+        """
+
+        for ch in text:
+            self.append(ch)
+        return self.distance
+
+    def pop(self):
+        """
+        Remove the last character of the target.
+
+        :return: str:removed character
+        """
+
+        if not self._target:
+            raise IndexError("pop from empty target")
+        self._columns.pop()
+        return self._target.pop()
+
+    def set_target(self, text):
+        """
+        Change the target, keeping the columns of the prefix it shares with
+        the current one.
+
+        :param text: new target string
+
+        :return: int:new distance
+        """
+
+        keep = 0
+        limit = min(len(text), len(self._target))
+        while keep < limit and text[keep] == self._target[keep]:
+            keep += 1
+        while len(self._target) > keep:
+            self.pop()
+        return self.extend(text[keep:])
+
+
+class IncrementalMatcher(object):
+    """
+    Type-ahead matching: the LD from each of many candidates to a target
+    that grows and shrinks at the end, with one IncrementalLD per candidate.
+
+    A candidate whose column minimum goes over max_distance cannot come back
+    within it while the target grows, so it is set aside and skipped by
+    later appends.  It is brought back when the target is cut back below the
+    point where it was set aside.
+    """
+
+    def __init__(self, candidates, max_distance, c=(1, 1, 1)):
+        """
+        :param candidates: iterable of strings
+        :param max_distance: largest LD to report
+        :param c: cost tuple [delete, insert, sub], for transforming a
+                  candidate into the target
+        """
+
+        self.max_distance = max_distance
+        self.costs = tuple(c)
+        self._live = [IncrementalLD(x, c) for x in candidates]
+        self._target = []
+        # candidates set aside at each target length
+        self._pruned = [[]]
+
+    def __len__(self):
+        return len(self._live)
+
+    @property
+    def target(self):
+        """
+        The current target string.
+        """
+
+        return "".join(self._target)
+
+    def append(self, ch):
+        """
+        Add a character to the end of the target.
+
+        :param ch: character
+        """
+
+        k = self.max_distance
+        live = []
+        pruned = []
+        for inc in self._live:
+            inc.append(ch)
+            if inc.min > k:
+                pruned.append(inc)
+            else:
+                live.append(inc)
+        self._live = live
+        self._target.append(ch)
+        self._pruned.append(pruned)
+
+    def extend(self, text):
+        """
+        Add characters to the end of the target.
+
+        :param text: string
+        """
+
+        for ch in text:
+            self.append(ch)
+
+    def pop(self):
+        """
+        Remove the last character of the target.
+        """
+
+        if not self._target:
+            raise IndexError("pop from empty target")
+        self._target.pop()
+        back = self._pruned.pop()
+        for inc in self._live:
+            inc.pop()
+        for inc in back:
+            inc.pop()
+        self._live.extend(back)
+
+    def set_target(self, text):
+        """
+        Change the target, keeping the work done for the prefix it shares
+        with the current one.
+
+        :param text: new target string
+        """
+
+        keep = 0
+        limit = min(len(text), len(self._target))
+        while keep < limit and text[keep] == self._target[keep]:
+            keep += 1
+        while len(self._target) > keep:
+            self.pop()
+        self.extend(text[keep:])
+
+    def matches(self, prefix=False):
+        """
+        Find the candidates within max_distance of the target.
+
+        :param prefix: if True, compare the target with the closest prefix of
+                       each candidate instead of the whole candidate
+
+        :return: list of (candidate, distance) tuples, closest first
+        """
+
+        k = self.max_distance
+        found = []
+        for inc in self._live:
+            dist = inc.min if prefix else inc.distance
+            if dist <= k:
+                found.append((inc.source, dist))
+        found.sort(key=lambda x: (x[1], x[0]))
+        return found
+
+
+class LDCache(object):
+    """
+    Bounded LRU cache of LD results, see enable_cache().
+
+    Entries are evicted least recently used first once either max_entries or
+    max_bytes is exceeded.  The byte count is an estimate of the memory held
+    by the keys and values (sys.getsizeof of the strings and results plus the
+    container overhead), good enough for sizing the cache.
+    """
+
+    def __init__(self, max_entries=100000, max_bytes=None):
+        """
+        :param max_entries: max number of cached results, None for no limit
+        :param max_bytes: max estimated size in bytes, None for no limit
+        """
+
+        import threading
+        from collections import OrderedDict
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _sizeof(key, value):
+        """
+        Estimate the memory held by one entry.
+
+        :param key: cache key
+        :param value: cached result
+
+        :return: int:bytes
+        """
+
+        import sys
+
+        size = sys.getsizeof(key) + sys.getsizeof(value) + 100
+        for part in key:
+            size += sys.getsizeof(part)
+        if isinstance(value, tuple):
+            for part in value:
+                size += sys.getsizeof(part)
+                if isinstance(part, tuple):
+                    size += len(part) * 120
+        return size
+
+    def get(self, key):
+        """
+        Look up a result, marking it as recently used.
+
+        :param key: cache key
+
+        :return: cached result, or None if it is not cached
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Store a result, evicting old ones as needed.
+
+        :param key: cache key
+        :param value: result to store
+        """
+
+        size = self._sizeof(key, value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+
+            while self._entries and ((self.max_entries is not None and len(self._entries) > self.max_entries) or
+                                     (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                old_key, old = self._entries.popitem(last=False)
+                self.bytes -= old[1]
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drop all entries.  The counters are kept.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """
+        :return: dict with hits, misses, evictions, entries, bytes and hit_rate
+        """
+
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def enable_cache(max_entries=100000, max_bytes=None):
+    """
+    Cache the results of find_ld (distance only calls), calc_ratio and
+    find_edit_ops.  Pairs that only differ in the order of the strings share
+    one entry where the result is symmetric.
+
+    :param max_entries: max number of cached results, None for no limit
+    :param max_bytes: max estimated size in bytes, None for no limit
+
+    :return: LDCache:cache, for reading its stats
+    """
+
+    global _cache
+    _cache = LDCache(max_entries, max_bytes)
+    return _cache
+
+
+def disable_cache():
+    """
+    Stop caching results and drop the cache.
+    """
+
+    global _cache
+    _cache = None
+
+
+def _cache_key(kind, s, t, c, extra=None, symmetric=True):
+    """
+    Build the cache key for a call.  The LD from s to t with costs (d, i, sub)
+    equals the LD from t to s with costs (i, d, sub), so symmetric keys put
+    the strings in a fixed order and swap the costs to match.
+
+    :param kind: name of the cached function
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub], or None
+    :param extra: any other argument the result depends on
+    :param symmetric: whether s and t can be swapped
+
+    :return: tuple:key
+    """
+
+    if c is not None:
+        c = tuple(c)
+    # lists and arrays cannot be hashed; sequences of other types only equal
+    # each other item by item, so all of them are keyed as tuples
+    if not isinstance(s, str) or not isinstance(t, str):
+        s = tuple(s)
+        t = tuple(t)
+    try:
+        swap = symmetric and t < s
+    except TypeError:
+        swap = False
+    if swap:
+        s, t = t, s
+        if c is not None:
+            c = (c[1], c[0], c[2])
+    return kind, s, t, c, extra
+
+
+def _tile_init(s, t, c, size, top, left, corners, tile_cols):
+    """
+    Worker process initializer for find_ld_parallel.
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+    :param size: tile size
+    :param top: shared array, bottom row of the last tile computed in each column
+    :param left: shared array, right column of the last tile computed in each row
+    :param corners: shared array of tile corners
+    :param tile_cols: number of tile columns
+    """
+
+    global _tile
+    _tile = s, t, c, size, top, left, corners, tile_cols
+
+
+def _tile_run(tile):
+    """
+    Worker process task for find_ld_parallel: fill one tile of the LD matrix
+    from its top row, left column and corner, and publish its bottom row,
+    right column and bottom right corner.
+
+    :param tile: tuple (tile row, tile col)
+    """
+
+    s, t, c, size, top, left, corners, tile_cols = _tile
+    d_cost, i_cost, s_cost = c
+    tile_row, tile_col = tile
+
+    r0 = tile_row * size
+    r1 = min(len(s), r0 + size)
+    c0 = tile_col * size
+    c1 = min(len(t), c0 + size)
+    t_part = t[c0:c1]
+
+    # row_v holds dist[row][c0..c1]
+    row_v = [corners[tile_row * (tile_cols + 1) + tile_col]]
+    row_v.extend(top[c0 + 1:c1 + 1])
+
+    for row in range(r0 + 1, r1 + 1):
+        s_char = s[row - 1]
+        diag = row_v[0]
+        left_v = row_v[0] = left[row]
+
+        for col in range(1, c1 - c0 + 1):
+            above = row_v[col]
+            if s_char == t_part[col - 1]:
+                cost = diag
+            else:
+                cost = diag + s_cost
+            if above + d_cost < cost:
+                cost = above + d_cost
+            if left_v + i_cost < cost:
+                cost = left_v + i_cost
+            diag = above
+            row_v[col] = left_v = cost
+
+        left[row] = left_v
+
+    top[c0 + 1:c1 + 1] = row_v[1:]
+    corners[(tile_row + 1) * (tile_cols + 1) + tile_col + 1] = row_v[-1]
+
+
+def find_ld_parallel(s, t, c=(1, 1, 1), workers=None, size=None):
+    """
+    Calculate only the LD between s and t on several cores.  The LD matrix
+    is cut into square tiles; the tiles on one anti-diagonal of tiles do not
+    depend on each other and are computed in parallel by a process pool.  A
+    tile only needs the bottom row of the tile above it, the right column of
+    the tile to its left and one corner value, so only those are exchanged,
+    through shared memory arrays: one row (len(t) + 1 cells), one column
+    (len(s) + 1 cells) and one corner per tile.  Each tile keeps one row, so
+    memory stays linear as in find_ld_distance.
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+    :param workers: number of worker processes, defaults to the CPU count
+    :param size: tile size, defaults to a size giving each worker several
+                 tiles per anti-diagonal
+
+    :return: int:ld
+    """
+
+    import multiprocessing
+    import os
+
+    d_cost, i_cost, s_cost = c
+    s, t = _strip_affix(s, t)
+    if not s or not t:
+        return len(s) * d_cost + len(t) * i_cost
+
+    workers = workers or os.cpu_count() or 1
+    if size is None:
+        size = max(256, min(len(s), len(t)) // (workers * 4))
+
+    tile_rows = -(-len(s) // size)
+    tile_cols = -(-len(t) // size)
+    typecode = "q" if all(isinstance(x, int) for x in c) else "d"
+
+    top = multiprocessing.RawArray(typecode, len(t) + 1)
+    left = multiprocessing.RawArray(typecode, len(s) + 1)
+    corners = multiprocessing.RawArray(typecode, (tile_rows + 1) * (tile_cols + 1))
+
+    # setup insert costs along the top and delete costs down the side
+    for col in range(len(t) + 1):
+        top[col] = col * i_cost
+    for row in range(len(s) + 1):
+        left[row] = row * d_cost
+    for tile_col in range(tile_cols + 1):
+        corners[tile_col] = min(tile_col * size, len(t)) * i_cost
+    for tile_row in range(tile_rows + 1):
+        corners[tile_row * (tile_cols + 1)] = min(tile_row * size, len(s)) * d_cost
+
+    pool = multiprocessing.Pool(workers, initializer=_tile_init,
+                                initargs=(s, t, c, size, top, left, corners, tile_cols))
+    try:
+        for k in range(tile_rows + tile_cols - 1):
+            tiles = [(tile_row, k - tile_row)
+                     for tile_row in range(max(0, k - tile_cols + 1), min(tile_rows - 1, k) + 1)]
+            pool.map(_tile_run, tiles)
+    finally:
+        pool.close()
+        pool.join()
+
+    return corners[-1]
+
+
+def find_ld(s, t, c=(1, 1, 1), matrix=True, max_distance=None, workers=None, tracer=None):
+    """
+    This code calculates the LD cost matrix.  Most of this code was adopted from
+    www.python-course.eu/levenshtein_distance.php.
+
+    :param s: source string.  Like the other engines, find_ld takes any
+              sequence of hashable items (lists, tuples, array('I') of
+              line ids...) as well as strings.
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+    :param matrix: build and return the full cost matrix, defaults to True.
+                   When False only the LD is computed and None is returned
+                   in place of the matrix; unit costs use the bit-parallel
+                   engine (find_ld_bitparallel), other costs the linear
+                   memory engine (find_ld_distance).
+    :param max_distance: if given, only find out whether the LD is within
+                   max_distance (see find_ld_bounded).  No matrix is built
+                   and max_distance + 1 is returned for anything farther.
+    :param workers: when only the LD is computed, split the work over this
+                   many processes (see find_ld_parallel).  Unit costs and
+                   costs without useful substitutions ignore it: their
+                   bit-parallel engines are faster on one core.
+    :param tracer: Tracer to report to, defaults to None.  Only tracers that
+                   want cell events slow the calculation down.
+
+    :return: int:ld, LDMatrix:dist
+
+        ldist is the Levenshtein distance between the strings s and t.
+        For all i and j, dist[i,j] will contain the Levenshtein
+        distance between the first i characters of s and the
+        first j characters of t
+
+        costs: a tuple or a list with three integers (d, i, s)
+               where d defines the costs for a deletion
+                     i defines the costs for an insertion and
+                     s defines the costs for a substitution
+
+        a horizontal move is an insertion of a letter from the 't string'
+        a vertical move is a deletion of a letter from the 's string'
+        a diagonal move is either:
+            a no-operation (both letters at respective positions are the same)
+            a substitution (letters at respective positions are distinct)
+    """
+
+    # distance only, no matrix
+    if max_distance is not None or not matrix:
+        if tracer is not None:
+            tracer.begin("find_ld_distance", s, t, c)
+            ld = find_ld(s, t, c, matrix, max_distance, workers)[0]
+            # the engine decides how much of the matrix it looks at, if any
+            tracer.end("find_ld_distance", 0)
+            return ld, None
+        if _cache is not None:
+            key = _cache_key("find_ld", s, t, c, max_distance)
+            ld = _cache.get(key)
+            if ld is None:
+                ld = _find_ld_only(s, t, c, max_distance, workers)
+                _cache.put(key, ld)
+            return ld, None
+        return _find_ld_only(s, t, c, max_distance, workers), None
+
+    # keep the shape of the matrix consistent.  The algorithm is symmetric
+    # once the delete and insert costs are swapped along with the strings
+    if len(s) < len(t):
+        return find_ld(t, s, (c[1], c[0], c[2]), tracer=tracer)
+
+    # null inputs
+    if len(t) == 0:
+        return len(s) * c[0], []
+
+    rows = len(s) + 1
+    cols = len(t) + 1
+
+    if tracer is not None:
+        tracer.begin("find_ld", s, t, c)
+
+    # same matrix, one anti-diagonal at a time, when numpy is around and
+    # the cells do not have to be reported one by one
+    if (tracer is None or not tracer.wants_cells) and rows * cols >= _numpy_min_cells and _numpy() is not None:
+        ld, dist = find_ld_numpy(s, t, c)
+        if tracer is not None:
+            tracer.end("find_ld", (rows - 1) * (cols - 1))
+        return ld, dist
+
+    # get costs from input tuple
+    d_cost, i_cost, s_cost = c
+
+    # setup blank matrices to hold distances and operations.  buf is the
+    # flat cell buffer, dist[row][col] is buf[row * cols + col]
+    dist = LDMatrix(rows, cols, _cell_typecode(rows - 1, cols - 1, c))
+    buf = dist.data
+
+    # setup delete costs
+    for row in range(1, rows):
+        buf[row * cols] = row * d_cost
+
+    # setup insert costs
+    for col in range(1, cols):
+        buf[col] = col * i_cost
+
+    if tracer is not None:
+        tracer.matrix("Initial Matrix:", dist)
+        if tracer.wants_cells:
+            _fill_traced(s, t, c, dist, tracer)
+            tracer.end("find_ld", (rows - 1) * (cols - 1))
+            return buf[-1], dist
+
+    for col in range(1, cols):
+        for row in range(1, rows):
+            here = row * cols + col
+
+            # determine costs
+            del_cost = buf[here - cols] + d_cost
+            ins_cost = buf[here - 1] + i_cost
+
+            # sub cost could be 0 if letters are the same
+            if s[row - 1] == t[col - 1]:
+                sub_cost = buf[here - cols - 1] + 0
+            else:
+                sub_cost = buf[here - cols - 1] + s_cost
+
+            # determine least costly operation
+            if del_cost == min(del_cost, ins_cost, sub_cost):
+                buf[here] = del_cost
+            elif ins_cost == min(del_cost, ins_cost, sub_cost):
+                buf[here] = ins_cost
+            else:
+                # sub_cost == min(del_cost, ins_cost, sub_cost):
+                buf[here] = sub_cost
+
+    if tracer is not None:
+        tracer.end("find_ld", (rows - 1) * (cols - 1))
+    return buf[-1], dist
+
+
+def _fill_traced(s, t, c, dist, tracer):
+    """
+    Fill the LD matrix like find_ld, reporting every cell to the tracer.
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+    :param dist: LDMatrix with the first row and column set up
+    :param tracer: Tracer with wants_cells set
+    """
+
+    d_cost, i_cost, s_cost = c
+    cols = len(t) + 1
+    buf = dist.data
+
+    for col in range(1, cols):
+        for row in range(1, len(s) + 1):
+            here = row * cols + col
+
+            del_cost = buf[here - cols] + d_cost
+            ins_cost = buf[here - 1] + i_cost
+            same = s[row - 1] == t[col - 1]
+            sub_cost = buf[here - cols - 1] + (0 if same else s_cost)
+
+            if del_cost == min(del_cost, ins_cost, sub_cost):
+                buf[here] = del_cost
+                op = "delete"
+            elif ins_cost == min(del_cost, ins_cost, sub_cost):
+                buf[here] = ins_cost
+                op = "insert"
+            else:
+                buf[here] = sub_cost
+                op = "substitute"
+
+            tracer.cell(row, col, del_cost, ins_cost, sub_cost, same, op, dist)
+
+
+def find_ld_numpy(s, t, c=(1, 1, 1)):
+    """
+    Calculate the LD cost matrix with numpy.  The cells on one anti-diagonal
+    (row + col == k) only depend on the two anti-diagonals before it, so each
+    anti-diagonal is computed as a whole with vectorized adds and mins.  The
+    matrix is identical to the one find_ld builds cell by cell.
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+
+    :return: int:ld, LDMatrix:dist
+    """
+
+    np = _numpy()
+    if np is None:
+        raise ImportError("find_ld_numpy needs numpy")
+
+    if len(s) < len(t):
+        return find_ld_numpy(t, s, (c[1], c[0], c[2]))
+    if len(t) == 0:
+        return len(s) * c[0], []
+
+    # a substitution dearer than delete + insert is never chosen; clamping it
+    # leaves every cell the same and keeps diag + s_cost inside the dtype
+    d_cost, i_cost, s_cost = c
+    s_cost = min(s_cost, d_cost + i_cost)
+    rows = len(s) + 1
+    cols = len(t) + 1
+    typecode = _cell_typecode(rows - 1, cols - 1, (d_cost, i_cost, s_cost))
+    buf = np.zeros(rows * cols, dtype={"i": np.intc, "q": np.int64, "d": np.float64}[typecode])
+
+    # setup delete and insert costs
+    buf[::cols] = np.arange(rows) * d_cost
+    buf[:cols] = np.arange(cols) * i_cost
+
+    # letters as integer codes; t reversed so that the letters met along an
+    # anti-diagonal are a plain slice
+    if isinstance(s, array) and isinstance(t, array) and s.typecode == t.typecode:
+        # already integer codes, e.g. the line ids of find_ld_files
+        s_codes = np.array(s)
+        t_rev = np.array(t)[::-1]
+    else:
+        codes = {}
+        s_codes = np.array([codes.setdefault(ch, len(codes)) for ch in s], dtype=np.intp)
+        t_rev = np.array([codes.setdefault(ch, len(codes)) for ch in reversed(t)], dtype=np.intp)
+
+    # flat index of (row, k - row) is row * (cols - 1) + k
+    base = np.arange(rows, dtype=np.intp) * (cols - 1)
+
+    for k in range(2, rows + cols - 1):
+        r_lo = max(1, k - cols + 1)
+        r_hi = min(rows - 1, k - 1)
+
+        here = base[r_lo:r_hi + 1] + k
+        same = s_codes[r_lo - 1:r_hi] == t_rev[r_lo + cols - 1 - k:r_hi + cols - k]
+
+        del_cost = buf[here - cols] + d_cost
+        ins_cost = buf[here - 1] + i_cost
+        sub_cost = buf[here - cols - 1] + np.where(same, 0, s_cost).astype(buf.dtype)
+        buf[here] = np.minimum(np.minimum(del_cost, ins_cost), sub_cost)
+
+    return buf[-1].item(), LDMatrix(rows, cols, typecode, data=buf)
+
+
+# keyboard rows for keyboard_costs(); each key sits between two keys of the row below
+_KEYBOARD = ("1234567890-=", "qwertyuiop[]", "asdfghjkl;'", "zxcvbnm,./")
+
+
+def keyboard_costs(near=0.5, case=0.25, c=(1, 1, 1), rows=_KEYBOARD):
+    """
+    Build a substitution table for find_ld_weighted where hitting a key next
+    to the right one, or the wrong case, costs less than other typos.
+
+        find_ld_weighted("hello", "jellp", sub=keyboard_costs())   -> 1.0
+
+    :param near: cost of substituting a neighbouring key
+    :param case: cost of changing the case of a letter
+    :param c: cost tuple [delete, insert, sub]; c[2] is the cost of any
+              other substitution and is only used to pick the cheaper cost
+    :param rows: keyboard rows, top to bottom
+
+    :return: dict of (char, char) -> cost
+    """
+
+    costs = {}
+
+    def add(a, b, cost):
+        for x, y in ((a, b), (b, a)):
+            if cost < costs.get((x, y), c[2]):
+                costs[x, y] = cost
+            if x.isalpha() and y.isalpha() and cost < costs.get((x.upper(), y.upper()), c[2]):
+                costs[x.upper(), y.upper()] = cost
+
+    for r, row in enumerate(rows):
+        for pos, key in enumerate(row):
+            if pos + 1 < len(row):
+                add(key, row[pos + 1], near)
+            if r + 1 < len(rows):
+                for below in rows[r + 1][max(0, pos - 1):pos + 1]:
+                    add(key, below, near)
+
+    for row in rows:
+        for key in row:
+            if key.isalpha():
+                add(key, key.upper(), case)
+    return costs
+
+
+def find_ld_weighted(s, t, c=(1, 1, 1), delete=None, insert=None, sub=None):
+    """
+    Calculate the LD with costs that depend on the characters: what it costs
+    to delete or insert each character, and to substitute each pair.
+
+        find_ld_weighted("Lawn", "lawn", sub={("L", "l"): 0.25})   -> 0.25
+
+    One row of the matrix is computed at a time with numpy.  Deletes and
+    substitutions only look at the row above, so they are whole-row
+    operations.  Inserts chain along the row: cur[j] = min(tmp[j],
+    cur[j - 1] + ins[j]).  With P the running sum of the insert costs this
+    is cur = P + minimum.accumulate(tmp - P), which is one more whole-row
+    operation.  The loop runs over the shorter string, with the tables
+    turned around to match when the strings are swapped, so the rows are
+    as long as possible.  Without numpy the same matrix is computed one
+    cell at a time.
+
+    :param s: source string (or sequence)
+    :param t: target string (or sequence)
+    :param c: cost tuple [delete, insert, sub], for everything the tables
+              leave out
+    :param delete: dict of character -> cost of deleting it from s
+    :param insert: dict of character -> cost of inserting it from t
+    :param sub: dict of (s char, t char) -> cost of substituting the first
+                with the second.  Equal characters cost 0 unless listed.
+
+    :return: int:ld (float:ld if any cost is a float)
+    """
+
+    delete = delete or {}
+    insert = insert or {}
+    sub = sub or {}
+
+    np = _numpy()
+    if np is None:
+        return _find_ld_weighted_python(s, t, c, delete, insert, sub)
+
+    # loop over the shorter string.  Swapped strings swap deletes and
+    # inserts, and substitutions go the other way
+    if len(s) > len(t):
+        s, t = t, s
+        c = (c[1], c[0], c[2])
+        delete, insert = insert, delete
+        sub = dict(((b, a), cost) for (a, b), cost in sub.items())
+
+    costs = list(c) + list(delete.values()) + list(insert.values()) + list(sub.values())
+    dtype = np.int64 if all(isinstance(x, int) for x in costs) else np.float64
+
+    # characters as integer codes, and the costs per code
+    codes = {}
+    s_codes = [codes.setdefault(ch, len(codes)) for ch in s]
+    t_codes = np.array([codes.setdefault(ch, len(codes)) for ch in t], dtype=np.intp)
+
+    def per_code(table, default):
+        out = np.full(len(codes), default, dtype=dtype)
+        for ch, cost in table.items():
+            if ch in codes:
+                out[codes[ch]] = cost
+        return out
+
+    del_codes = per_code(delete, c[0])
+    ins_path = np.zeros(len(t) + 1, dtype=dtype)
+    np.cumsum(per_code(insert, c[1])[t_codes], out=ins_path[1:])
+
+    sub_from = {}
+    for (a, b), cost in sub.items():
+        if a in codes and b in codes:
+            sub_from.setdefault(codes[a], []).append((codes[b], cost))
+
+    # substitution costs from each s character to every code, built on first use
+    sub_codes = {}
+
+    row_v = ins_path.copy()
+    tmp = np.empty(len(t) + 1, dtype=dtype)
+    for code in s_codes:
+        costs = sub_codes.get(code)
+        if costs is None:
+            costs = np.full(len(codes), c[2], dtype=dtype)
+            costs[code] = 0
+            for other, cost in sub_from.get(code, ()):
+                costs[other] = cost
+            sub_codes[code] = costs
+
+        d_cost = del_codes[code]
+        tmp[0] = row_v[0] + d_cost
+        np.minimum(row_v[1:] + d_cost, row_v[:-1] + costs[t_codes], out=tmp[1:])
+        row_v = ins_path + np.minimum.accumulate(tmp - ins_path)
+
+    return row_v[-1].item()
+
+
+def _find_ld_weighted_python(s, t, c, delete, insert, sub):
+    """
+    find_ld_weighted without numpy, one cell at a time.
+    """
+
+    d_default, i_default, s_default = c
+    ins_costs = [insert.get(ch, i_default) for ch in t]
+
+    row_v = [0]
+    for cost in ins_costs:
+        row_v.append(row_v[-1] + cost)
+
+    for s_char in s:
+        d_cost = delete.get(s_char, d_default)
+        diag = row_v[0]
+        left = row_v[0] = row_v[0] + d_cost
+
+        for col in range(1, len(t) + 1):
+            above = row_v[col]
+            t_char = t[col - 1]
+            cost = diag + sub.get((s_char, t_char), 0 if s_char == t_char else s_default)
+            if above + d_cost < cost:
+                cost = above + d_cost
+            if left + ins_costs[col - 1] < cost:
+                cost = left + ins_costs[col - 1]
+            diag = above
+            row_v[col] = left = cost
+
+    return row_v[-1]
+
+
+def _find_ld_only(s, t, c, max_distance, workers=None):
+    """
+    Pick the distance only engine for find_ld.
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub]
+    :param max_distance: max distance of interest, or None
+    :param workers: number of worker processes, or None
+
+    :return: int:ld
+    """
+
+    if max_distance is not None:
+        return find_ld_bounded(s, t, max_distance, c)
+    if tuple(c) == (1, 1, 1):
+        return find_ld_bitparallel(s, t)
+    if c[2] >= c[0] + c[1]:
+        lcs = find_lcs_length(s, t)
+        return c[0] * (len(s) - lcs) + c[1] * (len(t) - lcs)
+    if workers and workers > 1:
+        return find_ld_parallel(s, t, c, workers)
+    return find_ld_distance(s, t, c)
+
+
+def _max_ld(rows, cols, c):
+    """
+    Largest possible LD between strings of the given lengths: either delete
+    everything and insert everything, or substitute the overlap.
+
+    :param rows: length of the source string
+    :param cols: length of the target string
+    :param c: cost tuple [delete, insert, sub]
+
+    :return: int:ld
+    """
+
+    d_cost, i_cost, s_cost = c
+    overlap = min(rows, cols)
+    return min(rows * d_cost + cols * i_cost,
+               overlap * s_cost + (rows - overlap) * d_cost + (cols - overlap) * i_cost)
+
+
+def find_ld_and_ratio(s, t, c=(1, 1, 1), normalized=False):
+    """
+    Calculate the LD and the similarity ratio (see calc_ratio) in one pass
+    over the preprocessing: the common prefix and suffix are stripped once
+    and, for unit costs, the same pattern masks drive both the bit-parallel
+    LD and the bit-parallel LCS that gives the ratio.
+
+    :param s: source string
+    :param t: target string
+    :param c: cost tuple [delete, insert, sub] for the LD.  The ratio always
+              uses delete + insert for a substitution.
+    :param normalized: also return the LD divided by the largest LD possible
+                       for strings of these lengths (0.0 = same, 1.0 = nothing
+                       in common)
+
+    :return: int:ld, float:ratio (, float:normalized ld)
+    """
+
+    total = len(s) + len(t)
+    max_ld = _max_ld(len(s), len(t), c)
+
+    s, t = _strip_affix(s, t)
+    rows = len(s)
+    cols = len(t)
+
+    # pattern is the shorter of the two, text the longer
+    if rows < cols:
+        p, text = s, t
+    else:
+        p, text = t, s
+    masks = _build_masks(p)
+
+    lcs = _lcs_length(masks, len(p), text)
+    ratio = (total - (rows + cols - 2 * lcs)) / total if total else 1.0
+
+    if tuple(c) == (1, 1, 1):
+        ld = _myers_distance(masks, len(p), text)
+    elif c[2] >= c[0] + c[1]:
+        ld = c[0] * (rows - lcs) + c[1] * (cols - lcs)
+    else:
+        ld = find_ld_distance(s, t, c)
+
+    if normalized:
+        return ld, ratio, ld / max_ld if max_ld else 0.0
+    return ld, ratio
+
+
+def calc_ratio(s, t, score_cutoff=None):
+    """
+    Calculate the Levenshtein similarity ratio
+    ((len(s) + len(t)) - LD) / (len(s) + len(t)), where LD uses a sub cost of 2.
+
+    :param s: source string
+    :param t: target string
+    :param score_cutoff: if given, ratios below it are reported as 0.0 and
+                         the LD calculation stops as soon as the ratio
+                         cannot reach it
+
+    :return: float:ratio, 1.0 for two empty strings
+    """
+
+    if _cache is not None:
+        key = _cache_key("calc_ratio", s, t, None, score_cutoff)
+        ratio = _cache.get(key)
+        if ratio is None:
+            ratio = _calc_ratio(s, t, score_cutoff)
+            _cache.put(key, ratio)
+        return ratio
+    return _calc_ratio(s, t, score_cutoff)
+
+
+def _calc_ratio(s, t, score_cutoff):
+    """
+    Uncached calc_ratio.
+    """
+
+    total = len(s) + len(t)
+
+    # two empty strings are identical
+    if not total:
+        return 1.0 if score_cutoff is None or score_cutoff <= 1.0 else 0.0
+
+    # when calculating the ratio the cost of a sub=2
+    # think of it is delete + insert
+    if score_cutoff is None:
+        dist, m = find_ld(s, t, [1, 1, 2], matrix=False)
+        return (total - dist) / total
+
+    # largest LD that still gives a ratio >= score_cutoff
+    k = _ratio_limit(total, score_cutoff, None)
+    if k < 0:
+        return 0.0
+
+    dist, m = find_ld(s, t, [1, 1, 2], max_distance=k)
+    if dist > k:
+        return 0.0
+    return (total - dist) / total
+
+
+def _intern(path, mode, table, keys):
+    """
+    Turn the lines (or whitespace separated tokens) of a file into integer
+    ids.  The file is memory mapped and read as bytes, one line or token at
+    a time, so it is never decoded or held in memory as a whole; only one
+    copy of each distinct line is kept, in table.
+
+    :param path: file name
+    :param mode: "line" or "token"
+    :param table: dict of bytes -> id, shared by the files being compared
+    :param keys: list of bytes by id, extended along with table
+
+    :return: array('I'):ids
+    """
+
+    import mmap
+    import re
+
+    ids = array("I")
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            return ids
+
+        try:
+            if mode == "line":
+                items = (line.rstrip(b"\r\n") for line in iter(mm.readline, b""))
+            else:
+                items = (match.group() for match in re.finditer(rb"\S+", mm))
+            for item in items:
+                x = table.get(item)
+                if x is None:
+                    x = table[item] = len(keys)
+                    keys.append(item)
+                ids.append(x)
+            # the regex iterator holds on to the buffer
+            del items
+        finally:
+            mm.close()
+    return ids
+
+
+def find_ld_files(path_a, path_b, c=(1, 1, 1), mode="line", ops=False, max_distance=None, workers=None):
+    """
+    Calculate the LD between two files as sequences of lines (or tokens):
+    each edit inserts, deletes or replaces a whole line.
+
+    Both files are memory mapped and every distinct line is given an
+    integer id, so the engines compare two array('I') of ids instead of
+    strings.  Lines are compared as bytes, without their line ending, and
+    are never decoded.
+
+    :param path_a: source file
+    :param path_b: target file
+    :param c: cost tuple [delete, insert, sub]
+    :param mode: "line", or "token" for runs of non-whitespace bytes
+    :param ops: also find the edit operations (see find_edit_ops), with
+                the lines as bytes in place of the letters
+    :param max_distance: if given, only find out whether the LD is within
+                         max_distance (see find_ld_bounded); ignored with ops
+    :param workers: number of worker processes for the LD (see find_ld)
+
+    :return: int:ld, list:ops (None unless ops is True)
+    """
+
+    if mode not in ("line", "token"):
+        raise ValueError("mode must be 'line' or 'token', not " + repr(mode))
+
+    table = {}
+    keys = []
+    a = _intern(path_a, mode, table, keys)
+    b = _intern(path_b, mode, table, keys)
+    table = None
+
+    if ops:
+        ld, edits = find_edit_ops(a, b, c)
+        return ld, [(op, src_pos, dst_pos, keys[x]) for op, src_pos, dst_pos, x in edits]
+    return find_ld(a, b, c, matrix=False, max_distance=max_distance, workers=workers)[0], None
+
+
+def interactive():
+    """
+    Prompt for two words and show how the LD between them is calculated.
+    """
+
+    print()
+    print("Demonstrate computation of Levenshtein Distance (LD) between two words.")
+    print("Determine the minimum number of edits to transform source word into target word.")
+    print("For example, how many substitutions, insertions, or deletions are required to")
+    print("turn 'house' into 'home'?  (Answer: 2), or Democrat into Republican (Answer: 8).")
+    print()
+    print("The default cost for all edit operations is 1.")
+    print()
+    print("Debug:  0 = return only the LD")
+    print("        1 = return LD plus distance, minimum path, and operations matrices")
+    print("        2 = return all intermediate matrices and computations (i.e., lots of output")
+    print()
+    print("Other fun examples:")
+    print("  abc       -> xyz  LD: 3")
+    print("  kitten    -> sitting  LD: 3")
+    print("  intention -> execution  LD: 5")
+    print("  manahaton -> manhattan  LD 3")
+    print("  00101010  -> 110110  LD: 3")
+    print()
+
+    # get user inputs
+    source, target, verbose = get_user_input()
+
+    # setup the costs tuple
+    costs = [int(_del_cost), int(_ins_cost), int(_sub_cost)]
+
+    # keep shape of matrix consistent
+    if len(source) < len(target):
+        temp = source
+        source = target
+        target = temp
+        print("* switching source and target words to maintain matrix shape *")
+
+    # calculate Levenshtein distance and the Levenshtein similarity ratio
+    # ((len(s) + len(t)) - LD) / (len(s) + len(t))
+    ld, lev_ratio = find_ld_and_ratio(source, target, costs)
+
+    # print results
+    if verbose > 0:
+
+        # level 2 shows every step
+        tracer = PrintTracer() if verbose == 2 else None
+
+        # full matrix, only needed for the display
+        ld, dist_m = find_ld(source, target, costs, tracer=tracer)
+
+        # navigate results matrix to find minimum path
+        min_m = find_min_path(source, target, dist_m, tracer)
+
+        # build operations matrix
+        ws, ops_m = build_ops_matrix_and_ws(source, target, min_m)
+
+        print()
+        print("***** FINAL RESULTS *****")
+        print()
+        print("Final Distance Matrix:")
+        print_matrix(source, target, dist_m)
+        print()
+
+        print("Minimum Path Matrix: ")
+        print_matrix(source, target, min_m)
+        print()
+
+        print("Final Operations Matrix:")
+        print_matrix(source, target, ops_m)
+        print()
+
+        print("Sequential Edits:")
+        for s in ws:
+            print(s)
+
+    print()
+    print("Levenshtein Distance (LD) between '" + source + "' and '" + target + "' is: " + str(ld))
+    print("Levenshtein similarity ratio is: " + str(lev_ratio))
+    print()
+
+
+def _batch_pair(line):
+    """
+    Parse one batch input line: a JSON object with "source" and "target",
+    or source and target separated by a tab.
+
+    :param line: input line, without the line break
+
+    :return: str:source, str:target
+    """
+
+    import json
+
+    if line.startswith("{"):
+        pair = json.loads(line)
+        return pair["source"], pair["target"]
+
+    fields = line.split("\t")
+    if len(fields) != 2:
+        raise ValueError("expected 2 tab separated fields, got " + str(len(fields)))
+    return fields[0], fields[1]
+
+
+def _batch_chunk(args):
+    """
+    Process a chunk of batch input lines.  Runs in the worker processes when
+    --workers is given.
+
+    :param args: tuple (first line number, lines, costs, cutoff, ops)
+
+    :return: list:JSON output lines
+    """
+
+    import json
+
+    line_no, lines, c, cutoff, ops = args
+    out = []
+    for line in lines:
+        try:
+            s, t = _batch_pair(line)
+            result = {"source": s, "target": t}
+            if cutoff is not None and find_ld(s, t, c, max_distance=cutoff)[0] > cutoff:
+                result["distance"] = None
+                result["ratio"] = None
+            else:
+                result["distance"], result["ratio"] = find_ld_and_ratio(s, t, c)
+                if ops:
+                    result["ops"] = find_edit_ops(s, t, c)[1]
+        except (ValueError, KeyError, TypeError) as e:
+            result = {"line": line_no, "error": str(e)}
+        out.append(json.dumps(result))
+        line_no += 1
+    return out
+
+
+def run_batch(src, dst, c=(1, 1, 1), cutoff=None, ops=False, workers=None, chunk=256):
+    """
+    Stream pairs of strings from src and write one JSON line per pair to dst.
+    Only a bounded number of chunks is in flight at any time, so memory does
+    not grow with the size of the input.
+
+    :param src: file object with one pair per line (TSV or JSON lines)
+    :param dst: file object for the JSON lines output
+    :param c: cost tuple [delete, insert, sub]
+    :param cutoff: max distance of interest; farther pairs get a null
+                   distance and ratio
+    :param ops: include the edit operations (see find_edit_ops)
+    :param workers: number of worker processes, defaults to None (run here)
+    :param chunk: number of lines per chunk handed to a worker
+
+    :return: int:number of lines processed
+    """
+
+    from collections import deque
+    from itertools import islice
+
+    def chunks():
+        line_no = 1
+        while True:
+            lines = [line.rstrip("\r\n") for line in islice(src, chunk)]
+            if not lines:
+                return
+            yield line_no, lines, c, cutoff, ops
+            line_no += len(lines)
+
+    count = 0
+    if not workers or workers < 2:
+        for task in chunks():
+            for line in _batch_chunk(task):
+                dst.write(line + "\n")
+                count += 1
+        return count
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in chunks():
+            pending.append(pool.submit(_batch_chunk, task))
+            # keep the workers busy, but do not read ahead of them
+            while len(pending) >= workers * 2:
+                for line in pending.popleft().result():
+                    dst.write(line + "\n")
+                    count += 1
+        while pending:
+            for line in pending.popleft().result():
+                dst.write(line + "\n")
+                count += 1
+    return count
+
+
+def _number(text):
+    """
+    Parse a command line cost or cutoff: int if it is one, else float.
+
+    :param text: str:value
+
+    :return: int or float
+    """
+
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def main(argv=None):
+    """
+    Command line entry point.  Without arguments the interactive demo runs;
+    with --batch pairs are streamed from a file or stdin, and with --files
+    two files are compared line by line.
+
+    :param argv: command line arguments, defaults to sys.argv[1:]
+    """
+
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Calculate the Levenshtein Distance (LD) between strings.")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                        help="read pairs (TSV or JSON lines) from FILE, or stdin if omitted or '-', "
+                             "and write JSON lines to stdout")
+    parser.add_argument("--costs", default="{},{},{}".format(_del_cost, _ins_cost, _sub_cost),
+                        help="delete,insert,sub costs (default: %(default)s)")
+    parser.add_argument("--cutoff", type=_number, help="max distance of interest; farther pairs get a null distance")
+    parser.add_argument("--ops", action="store_true", help="include the edit operations")
+    parser.add_argument("--workers", type=int, help="number of worker processes")
+    parser.add_argument("--files", nargs=2, metavar=("FILE_A", "FILE_B"),
+                        help="LD between two files as sequences of lines, written as one JSON line")
+    parser.add_argument("--tokens", action="store_true", help="with --files, compare tokens instead of lines")
+    args = parser.parse_args(argv)
+
+    if args.batch is None and args.files is None:
+        interactive()
+        return
+
+    try:
+        costs = tuple(_number(x) for x in args.costs.split(","))
+    except ValueError:
+        costs = ()
+    if len(costs) != 3:
+        parser.error("--costs needs 3 numbers, e.g. 1,1,2")
+
+    if args.files is not None:
+        import json
+
+        ld, ops = find_ld_files(args.files[0], args.files[1], costs, "token" if args.tokens else "line",
+                                args.ops, args.cutoff, args.workers)
+        # past the cutoff ld is only the k + 1 sentinel, report it like --batch
+        if args.cutoff is not None and ld > args.cutoff:
+            result = {"distance": None}
+            ops = None
+        else:
+            result = {"distance": ld}
+        if ops is not None:
+            result["ops"] = [(op, src_pos, dst_pos, item.decode("utf-8", "replace"))
+                             for op, src_pos, dst_pos, item in ops]
+        sys.stdout.write(json.dumps(result) + "\n")
+        return
+
+    if args.batch == "-":
+        run_batch(sys.stdin, sys.stdout, costs, args.cutoff, args.ops, args.workers)
+    else:
+        with open(args.batch, encoding="utf-8") as src:
+            run_batch(src, sys.stdout, costs, args.cutoff, args.ops, args.workers)
+
+
+# #### MAIN ####
+if __name__ == "__main__":
+    main()
 
 # <>< #
@@ -0,0 +1,365 @@
+"""
+=====================================================================
+NAME:       LD_bench.py
+
+PURPOSE:    Benchmark the LD engines in LD.py over a grid of inputs so
+            changes to find_ld, find_min_path, calc_ratio and friends
+            can be checked for speed and memory regressions.
+
+            The grid covers string length (10 to 100k), alphabet size
+            (binary, DNA, ASCII, full Unicode), similarity level (how
+            many random edits separate source and target), cost tuples,
+            and the single pair vs batch paths.  Every case reports
+            calls/sec, latency percentiles and peak memory (tracemalloc),
+            and the whole run can be saved as JSON and compared against
+            an earlier run.
+
+            Inputs come from a seeded random generator, so two runs with
+            the same arguments time exactly the same strings.
+
+USAGE:      >python LD_bench.py --quick
+            >python LD_bench.py --out new.json --compare old.json
+            >python LD_bench.py --engines bitparallel,bounded --lengths 1000,100000
+
+            Cases that would take too long for an engine (e.g. a 100k x
+            100k full matrix) are skipped; see max_cells in ENGINES.
+
+=====================================================================
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import LD
+
+ALPHABETS = {
+    "binary": "01",
+    "dna": "acgt",
+    "ascii": "".join(chr(x) for x in range(32, 127)),
+    # letters from several scripts, outside the surrogate range
+    "unicode": "".join(chr(x) for x in list(range(0x00c0, 0x0250)) + list(range(0x0391, 0x03ca)) +
+                       list(range(0x0410, 0x0450)) + list(range(0x4e00, 0x4f00)) +
+                       list(range(0x1f600, 0x1f650))),
+}
+
+# fraction of positions changed between source and target
+SIMILARITY = {"near": 0.05, "mid": 0.3, "unrelated": 1.0}
+
+COSTS = {"unit": (1, 1, 1), "indel": (1, 1, 2), "weighted": (2, 2, 3)}
+
+LENGTHS = [10, 100, 1000, 10000, 100000]
+
+# batch cases compare one query against this many choices
+BATCH_SIZE = 1000
+
+
+def _run_find_ld(s, t, c):
+    return LD.find_ld(s, t, c)
+
+
+def _run_find_ld_python(s, t, c):
+    np = LD._np
+    LD._np = False
+    try:
+        return LD.find_ld(s, t, c)
+    finally:
+        LD._np = np
+
+
+def _run_distance(s, t, c):
+    return LD.find_ld_distance(s, t, c)
+
+
+def _run_auto(s, t, c):
+    return LD.find_ld(s, t, c, matrix=False)
+
+
+def _run_bitparallel(s, t, c):
+    return LD.find_ld_bitparallel(s, t)
+
+
+def _run_bounded(s, t, c):
+    return LD.find_ld(s, t, c, max_distance=3)
+
+
+def _run_ratio(s, t, c):
+    return LD.calc_ratio(s, t)
+
+
+def _run_ld_and_ratio(s, t, c):
+    return LD.find_ld_and_ratio(s, t, c)
+
+
+def _run_min_path(s, t, c):
+    ld, dist = LD.find_ld(s, t, c)
+    return LD.find_min_path(s, t, dist)
+
+
+def _run_edit_ops(s, t, c):
+    return LD.find_edit_ops(s, t, c)
+
+
+def _run_weighted(s, t, c):
+    return LD.find_ld_weighted(s, t, c, sub=_KEYBOARD_COSTS)
+
+
+def _run_distances(s, choices, c):
+    return LD.distances(s, choices, c)
+
+
+def _run_single_loop(s, choices, c):
+    return [LD.find_ld(s, x, c, matrix=False)[0] for x in choices]
+
+
+def _run_extract(s, choices, c):
+    return LD.extract(s, choices, 5, scorer="distance", c=c)
+
+
+_KEYBOARD_COSTS = LD.keyboard_costs()
+
+# name: (function, batch, unit costs only, max cells per call).  max cells
+# is a dict by cost tuple name where the engine behind the call depends on it
+ENGINES = {
+    "find_ld": (_run_find_ld, False, False, 4 * 10 ** 6),
+    "find_ld_python": (_run_find_ld_python, False, False, 10 ** 5),
+    "distance": (_run_distance, False, False, 10 ** 6),
+    "auto": (_run_auto, False, False, {"unit": 10 ** 10, "indel": 10 ** 10, "weighted": 10 ** 6}),
+    "bitparallel": (_run_bitparallel, False, True, 10 ** 10),
+    "bounded": (_run_bounded, False, False, 10 ** 10),
+    "ratio": (_run_ratio, False, True, 10 ** 10),
+    "ld_and_ratio": (_run_ld_and_ratio, False, False, {"unit": 10 ** 10, "indel": 10 ** 10, "weighted": 10 ** 6}),
+    "min_path": (_run_min_path, False, False, 10 ** 6),
+    "edit_ops": (_run_edit_ops, False, False, 10 ** 6),
+    "weighted_tables": (_run_weighted, False, False, 10 ** 8),
+    "batch_distances": (_run_distances, True, False, 10 ** 6),
+    "batch_single_loop": (_run_single_loop, True, False, 10 ** 6),
+    "batch_extract": (_run_extract, True, False, 10 ** 7),
+}
+
+
+def make_pair(rng, length, alphabet, similarity):
+    """
+    Build a source string and a target string a given share of random
+    edits away from it.
+
+    :param rng: random.Random
+    :param length: length of the source string
+    :param alphabet: letters to draw from
+    :param similarity: fraction of positions to edit
+
+    :return: str:source, str:target
+    """
+
+    source = [rng.choice(alphabet) for x in range(length)]
+    if similarity >= 1.0:
+        return "".join(source), "".join(rng.choice(alphabet) for x in range(length))
+
+    target = source[:]
+    for x in range(int(length * similarity)):
+        pos = rng.randrange(len(target) + 1)
+        op = rng.randrange(3)
+        if op == 0 and pos < len(target):
+            del target[pos]
+        elif op == 1:
+            target.insert(pos, rng.choice(alphabet))
+        elif pos < len(target):
+            target[pos] = rng.choice(alphabet)
+    return "".join(source), "".join(target)
+
+
+def measure(func, args, min_time, max_calls):
+    """
+    Time repeated calls of func, then measure the peak memory of one call.
+
+    :param func: function to call
+    :param args: arguments for func
+    :param min_time: keep calling for at least this many seconds
+    :param max_calls: stop after this many calls
+
+    :return: dict with calls, ops_per_sec, p50, p90, p99 (seconds) and peak_bytes
+    """
+
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_calls:
+        t0 = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - t0)
+        if time.perf_counter() - start >= min_time:
+            break
+
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times.sort()
+
+    def pct(p):
+        return times[min(len(times) - 1, int(p * len(times)))]
+
+    return {"calls": len(times),
+            "ops_per_sec": len(times) / sum(times) if sum(times) else 0.0,
+            "p50": pct(0.50),
+            "p90": pct(0.90),
+            "p99": pct(0.99),
+            "peak_bytes": peak}
+
+
+def run(engines, lengths, alphabets, similarities, costs, min_time, max_calls, seed, log=sys.stderr):
+    """
+    Run every combination of the given parameters.
+
+    :return: list of result dicts
+    """
+
+    results = []
+    for length in lengths:
+        for alpha_name in alphabets:
+            for sim_name in similarities:
+                rng = random.Random("{}-{}-{}-{}".format(seed, length, alpha_name, sim_name))
+                s, t = make_pair(rng, length, ALPHABETS[alpha_name], SIMILARITY[sim_name])
+                choices = None
+
+                for cost_name in costs:
+                    c = COSTS[cost_name]
+                    for name in engines:
+                        func, batch, unit_only, max_cells = ENGINES[name]
+                        if unit_only and c != (1, 1, 1):
+                            continue
+
+                        if batch:
+                            if choices is None:
+                                choices = [make_pair(rng, length, ALPHABETS[alpha_name],
+                                                     SIMILARITY[sim_name])[1] for x in range(BATCH_SIZE)]
+                            cells = length * length * BATCH_SIZE
+                            args = (s, choices, c)
+                        else:
+                            cells = len(s) * len(t)
+                            args = (s, t, c)
+
+                        # cases over the engine's cell budget would take too long
+                        if isinstance(max_cells, dict):
+                            max_cells = max_cells[cost_name]
+                        if cells > max_cells:
+                            continue
+
+                        result = {"engine": name,
+                                  "length": length,
+                                  "alphabet": alpha_name,
+                                  "similarity": sim_name,
+                                  "costs": cost_name,
+                                  "batch": BATCH_SIZE if batch else 1}
+                        result.update(measure(func, args, min_time, max_calls))
+                        results.append(result)
+                        log.write("{engine:18} len={length:<7} {alphabet:8} {similarity:9} {costs:8} "
+                                  "{ops_per_sec:12.1f}/s  p50={p50:.6f}s  peak={peak_bytes}B\n".format(**result))
+    return results
+
+
+def _key(result):
+    return result["engine"], result["length"], result["alphabet"], result["similarity"], result["costs"]
+
+
+def compare(old, new, threshold, out=sys.stdout):
+    """
+    Print the speed and memory change of every case present in both runs.
+
+    :param old: results of the baseline run
+    :param new: results of the new run
+    :param threshold: relative change counted as a regression, e.g. 0.1
+
+    :return: int:number of regressions
+    """
+
+    old_by_key = dict((_key(x), x) for x in old)
+    regressions = 0
+    for result in new:
+        base = old_by_key.get(_key(result))
+        if base is None or not base["ops_per_sec"]:
+            continue
+
+        speed = result["ops_per_sec"] / base["ops_per_sec"] - 1
+        memory = (result["peak_bytes"] + 1) / (base["peak_bytes"] + 1) - 1
+        flag = ""
+        if speed < -threshold or memory > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        out.write("{:18} len={:<7} {:8} {:9} {:8} speed {:+7.1%}  memory {:+7.1%}{}\n".format(
+            result["engine"], result["length"], result["alphabet"], result["similarity"],
+            result["costs"], speed, memory, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the LD engines.")
+    parser.add_argument("--quick", action="store_true", help="small grid for a fast check")
+    parser.add_argument("--engines", help="comma separated engines (default: all): " + ",".join(ENGINES))
+    parser.add_argument("--lengths", help="comma separated string lengths")
+    parser.add_argument("--alphabets", help="comma separated alphabets: " + ",".join(ALPHABETS))
+    parser.add_argument("--similarity", help="comma separated similarity levels: " + ",".join(SIMILARITY))
+    parser.add_argument("--costs", help="comma separated cost tuples: " + ",".join(COSTS))
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per case (default: %(default)s)")
+    parser.add_argument("--max-calls", type=int, default=10000, help="calls per case (default: %(default)s)")
+    parser.add_argument("--seed", default="ld-bench", help="input generator seed")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown or memory growth reported as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    def pick(value, default):
+        return value.split(",") if value else default
+
+    if args.quick:
+        lengths = [10, 100, 1000]
+        alphabets = ["dna", "ascii"]
+        similarities = ["near", "unrelated"]
+        costs = ["unit", "weighted"]
+    else:
+        lengths = LENGTHS
+        alphabets = list(ALPHABETS)
+        similarities = list(SIMILARITY)
+        costs = list(COSTS)
+
+    engines = pick(args.engines, list(ENGINES))
+    lengths = [int(x) for x in pick(args.lengths, lengths)]
+    alphabets = pick(args.alphabets, alphabets)
+    similarities = pick(args.similarity, similarities)
+    costs = pick(args.costs, costs)
+
+    for name, values, known in (("engine", engines, ENGINES), ("alphabet", alphabets, ALPHABETS),
+                                ("similarity", similarities, SIMILARITY), ("costs", costs, COSTS)):
+        for value in values:
+            if value not in known:
+                parser.error("unknown {}: {}".format(name, value))
+
+    results = run(engines, lengths, alphabets, similarities, costs, args.min_time, args.max_calls, args.seed)
+
+    np = LD._numpy()
+    report = {"meta": {"python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "numpy": np.__version__ if np is not None else None,
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "seed": args.seed,
+                       "min_time": args.min_time},
+              "results": results}
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)["results"]
+        if compare(old, results, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
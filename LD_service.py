@@ -0,0 +1,351 @@
+"""
+=====================================================================
+NAME:       LD_service.py
+
+PURPOSE:    Local asyncio service answering LD requests, so callers do
+            not pay process start up or per call set up.
+
+            Requests are JSON lines over localhost TCP or a Unix socket;
+            every request gets one JSON line back with the same "id":
+
+              {"id": 1, "op": "distance", "source": "lawn", "target": "flaw"}
+              {"id": 1, "result": 2}
+
+            ops:    distance  source, target, [costs], [max_distance]
+                    ratio     source, target, [score_cutoff]
+                    search    word, k       (needs --index, a BKTree file
+                                             written by BKTree.save)
+                    nearest   word, [n]     (needs --index)
+                    stats     service metrics, answered right away
+
+            Concurrent requests are queued and coalesced into micro
+            batches (up to --batch-size requests, or whatever arrived
+            within --max-delay-ms), and each batch runs in a process
+            pool.  The queue holds at most --queue-limit requests; past
+            that, requests are rejected with an "overloaded" error so
+            callers can back off.
+
+USAGE:      >python LD_service.py --port 8765 --workers 4
+            >python LD_service.py --unix /tmp/ld.sock --index words.bk
+
+=====================================================================
+"""
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+import LD
+
+# BKTree of the worker process, see _init_worker()
+_index = None
+
+
+def _init_worker(index_path):
+    """
+    Worker process initializer: load the search index once.
+
+    :param index_path: file written by BKTree.save, or None
+    """
+
+    global _index
+    if index_path:
+        _index = LD.BKTree.load(index_path)
+
+
+def _run_one(op, req):
+    """
+    Answer one request.
+
+    :param op: request op
+    :param req: request dict
+
+    :return: JSON-able result
+    """
+
+    if op == "distance":
+        return LD.find_ld(req["source"], req["target"], tuple(req.get("costs", (1, 1, 1))),
+                          matrix=False, max_distance=req.get("max_distance"))[0]
+    if op == "ratio":
+        return LD.calc_ratio(req["source"], req["target"], req.get("score_cutoff"))
+    if op in ("search", "nearest"):
+        if _index is None:
+            raise ValueError("no search index loaded (start the service with --index)")
+        if op == "search":
+            return _index.search(req["word"], int(req["k"]))
+        return _index.nearest(req["word"], int(req.get("n", 1)))
+    raise ValueError("unknown op: " + str(op))
+
+
+def _run_batch(batch):
+    """
+    Worker process task: answer a micro batch of requests.
+
+    :param batch: list of (op, request dict)
+
+    :return: list of (bool:ok, result or error message)
+    """
+
+    results = []
+    for op, req in batch:
+        try:
+            results.append((True, _run_one(op, req)))
+        except (KeyError, TypeError, ValueError) as e:
+            results.append((False, "{}: {}".format(type(e).__name__, e)))
+    return results
+
+
+class Overloaded(Exception):
+    """
+    The request queue is full.
+    """
+
+
+class Batcher(object):
+    """
+    Coalesce concurrent requests into micro batches for a process pool.
+    """
+
+    def __init__(self, pool, batch_size=64, max_delay=0.002, queue_limit=10000, max_batches=None):
+        """
+        :param pool: concurrent.futures executor to run the batches in
+        :param batch_size: max requests per batch
+        :param max_delay: max seconds to wait for a batch to fill up
+        :param queue_limit: max queued requests before rejecting new ones
+        :param max_batches: max batches running at once, defaults to 2
+        """
+
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue(maxsize=queue_limit)
+        self._slots = asyncio.Semaphore(max_batches or 2)
+
+        self.started = time.monotonic()
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched = 0
+        self.queue_wait = collections.deque(maxlen=10000)
+        self.latency = collections.deque(maxlen=10000)
+
+    def submit(self, op, req):
+        """
+        Queue a request.
+
+        :param op: request op
+        :param req: request dict
+
+        :return: future for the result
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((op, req, future, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise Overloaded("overloaded: {} requests queued".format(self.queue.qsize()))
+        self.requests += 1
+        return future
+
+    async def run(self):
+        """
+        Take batches off the queue and dispatch them, forever.
+        """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(items) < self.batch_size:
+                if self.queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    items.append(self.queue.get_nowait())
+
+            await self._slots.acquire()
+            now = time.monotonic()
+            for item in items:
+                self.queue_wait.append(now - item[3])
+            loop.create_task(self._dispatch(items))
+
+    async def _dispatch(self, items):
+        """
+        Run one batch in the pool and resolve its futures.
+
+        :param items: list of (op, request dict, future, queued at)
+        """
+
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.pool, _run_batch, [(x[0], x[1]) for x in items])
+        except Exception as e:
+            results = [(False, "{}: {}".format(type(e).__name__, e))] * len(items)
+        finally:
+            self._slots.release()
+
+        self.batches += 1
+        self.batched += len(items)
+        now = time.monotonic()
+        for item, result in zip(items, results):
+            self.latency.append(now - item[3])
+            if not item[2].done():
+                item[2].set_result(result)
+
+    def stats(self):
+        """
+        :return: dict of service metrics
+        """
+
+        def summary(values):
+            values = sorted(values)
+            if not values:
+                return {"mean": 0.0, "p50": 0.0, "p99": 0.0}
+            return {"mean": sum(values) / len(values),
+                    "p50": values[len(values) // 2],
+                    "p99": values[min(len(values) - 1, int(len(values) * 0.99))]}
+
+        uptime = time.monotonic() - self.started
+        return {"uptime": uptime,
+                "requests": self.requests,
+                "rejected": self.rejected,
+                "completed": self.batched,
+                "throughput": self.batched / uptime if uptime else 0.0,
+                "batches": self.batches,
+                "mean_batch_size": self.batched / self.batches if self.batches else 0.0,
+                "queued": self.queue.qsize(),
+                "queue_wait": summary(self.queue_wait),
+                "latency": summary(self.latency)}
+
+
+async def _answer(batcher, writer, req):
+    """
+    Answer one request line and write the response.
+
+    :param batcher: Batcher
+    :param writer: asyncio.StreamWriter
+    :param req: request dict
+    """
+
+    response = {"id": req.get("id")}
+    op = req.get("op")
+    try:
+        if op == "stats":
+            response["result"] = batcher.stats()
+        else:
+            ok, result = await batcher.submit(op, req)
+            response["result" if ok else "error"] = result
+    except Overloaded as e:
+        response["error"] = str(e)
+
+    writer.write((json.dumps(response) + "\n").encode("utf-8"))
+    await writer.drain()
+
+
+async def _handle(batcher, reader, writer):
+    """
+    Serve one client connection.
+
+    :param batcher: Batcher
+    :param reader: asyncio.StreamReader
+    :param writer: asyncio.StreamWriter
+    """
+
+    tasks = set()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                req = json.loads(line)
+                if not isinstance(req, dict):
+                    raise ValueError("request must be a JSON object")
+            except ValueError as e:
+                writer.write((json.dumps({"id": None, "error": "bad request: " + str(e)}) + "\n").encode("utf-8"))
+                continue
+
+            task = asyncio.ensure_future(_answer(batcher, writer, req))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.wait(tasks)
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, unix=None, workers=None, batch_size=64,
+                max_delay=0.002, queue_limit=10000, index=None, ready=None):
+    """
+    Run the service until cancelled.
+
+    :param host: TCP host, defaults to localhost
+    :param port: TCP port
+    :param unix: Unix socket path, used instead of TCP if given
+    :param workers: number of worker processes, defaults to the CPU count
+    :param batch_size: max requests per batch
+    :param max_delay: max seconds to wait for a batch to fill up
+    :param queue_limit: max queued requests before rejecting new ones
+    :param index: BKTree file for search/nearest, or None
+    :param ready: optional asyncio.Event set once the server listens
+    """
+
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    # ProcessPoolExecutor starts os.cpu_count() processes when workers is None
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(index,)) as pool:
+        batcher = Batcher(pool, batch_size, max_delay, queue_limit, max_batches=workers * 2)
+
+        def handle(reader, writer):
+            return _handle(batcher, reader, writer)
+
+        if unix:
+            server = await asyncio.start_unix_server(handle, path=unix)
+        else:
+            server = await asyncio.start_server(handle, host, port)
+
+        batch_task = asyncio.ensure_future(batcher.run())
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve LD requests over a local socket.")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: %(default)s)")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=64, help="max requests per batch (default: %(default)s)")
+    parser.add_argument("--max-delay-ms", type=float, default=2.0,
+                        help="max wait for a batch to fill up (default: %(default)s)")
+    parser.add_argument("--queue-limit", type=int, default=10000,
+                        help="max queued requests before rejecting (default: %(default)s)")
+    parser.add_argument("--index", help="BKTree file (BKTree.save) for search and nearest")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.batch_size,
+                          args.max_delay_ms / 1000.0, args.queue_limit, args.index))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
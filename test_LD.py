@@ -0,0 +1,618 @@
+"""
+=====================================================================
+NAME:       test_LD.py
+
+PURPOSE:    Differential tests for LD.py: every fast engine is checked
+            against the plain full-matrix DP, or another brute-force
+            reference, on seeded random pairs and several cost tuples,
+            including float costs and costs large enough to overflow
+            32 bit cells.
+
+USAGE:      >python -m pytest test_LD.py
+            >python -m unittest test_LD
+
+=====================================================================
+"""
+import random
+import unittest
+
+import LD
+
+COSTS = [(1, 1, 1), (1, 1, 2), (2, 3, 4), (3, 1, 1), (1.5, 0.5, 1.25), (10 ** 8, 10 ** 8, 10 ** 8),
+         (1, 1, 2 ** 31 - 1)]
+
+
+def plain_ld(s, t, c):
+    """
+    The textbook LD matrix, no shortcuts.
+
+    :return: list of lists:matrix
+    """
+
+    d_cost, i_cost, s_cost = c
+    dist = [[0] * (len(t) + 1) for x in range(len(s) + 1)]
+    for row in range(1, len(s) + 1):
+        dist[row][0] = row * d_cost
+    for col in range(1, len(t) + 1):
+        dist[0][col] = col * i_cost
+    for row in range(1, len(s) + 1):
+        for col in range(1, len(t) + 1):
+            sub = 0 if s[row - 1] == t[col - 1] else s_cost
+            dist[row][col] = min(dist[row - 1][col] + d_cost,
+                                 dist[row][col - 1] + i_cost,
+                                 dist[row - 1][col - 1] + sub)
+    return dist
+
+
+def random_pairs(seed, count, max_len=40):
+    """
+    Seeded random pairs over small and large alphabets, some of them close.
+    """
+
+    rng = random.Random(seed)
+    pairs = []
+    for x in range(count):
+        alphabet = rng.choice(["ab", "acgt", "abcdefghijklmnopqrstuvwxyz"])
+        s = "".join(rng.choice(alphabet) for y in range(rng.randrange(max_len + 1)))
+        if rng.random() < 0.5:
+            t = list(s)
+            for y in range(rng.randrange(4)):
+                pos = rng.randrange(len(t) + 1)
+                if rng.random() < 0.5 and pos < len(t):
+                    del t[pos]
+                else:
+                    t.insert(pos, rng.choice(alphabet))
+            t = "".join(t)
+        else:
+            t = "".join(rng.choice(alphabet) for y in range(rng.randrange(max_len + 1)))
+        pairs.append((s, t))
+    return pairs
+
+
+class RatioTest(unittest.TestCase):
+
+    def test_ratio(self):
+        for s, t in random_pairs("ld-ratio", 60):
+            if not s and not t:
+                continue
+            total = len(s) + len(t)
+            expected = (total - plain_ld(s, t, (1, 1, 2))[-1][-1]) / total
+            self.assertEqual(LD.calc_ratio(s, t), expected, (s, t))
+            for cutoff in (0.3, 0.6, 0.9):
+                self.assertEqual(LD.calc_ratio(s, t, cutoff), expected if expected >= cutoff else 0.0,
+                                 (s, t, cutoff))
+
+    def test_ratio_empty(self):
+        self.assertEqual(LD.calc_ratio("", ""), 1.0)
+        self.assertEqual(LD.calc_ratio("", "", 0.5), 1.0)
+        self.assertEqual(LD.calc_ratio("", "", 1.0), 1.0)
+        self.assertEqual(LD.calc_ratio("", "a"), 0.0)
+
+
+class DistanceTest(unittest.TestCase):
+
+    def test_find_ld_distance(self):
+        for s, t in random_pairs("ld-distance", 60):
+            for c in COSTS:
+                expected = plain_ld(s, t, c)[-1][-1]
+                self.assertEqual(LD.find_ld_distance(s, t, c), expected, (s, t, c))
+                self.assertEqual(LD.find_ld(s, t, c, matrix=False)[0], expected, (s, t, c))
+
+
+class BoundedTest(unittest.TestCase):
+
+    def test_find_ld_bounded(self):
+        for s, t in random_pairs("ld-bounded", 60):
+            for c in COSTS:
+                ld = plain_ld(s, t, c)[-1][-1]
+                for k in (0, 1, 2, 3.5, 5, 20):
+                    expected = ld if ld <= k else k + 1
+                    self.assertEqual(LD.find_ld_bounded(s, t, k, c), expected, (s, t, k, c))
+                    self.assertEqual(LD.find_ld(s, t, c, max_distance=k)[0], expected, (s, t, k, c))
+
+    def test_find_ld_bounded_float_sentinel(self):
+        self.assertEqual(LD.find_ld_bounded("aa", "abbb", 2, (1.5, 0.5, 1.25)), 3)
+        self.assertEqual(LD.find_ld_bounded("ac", "bcca", 4.5, (2, 1, 5)), 5.5)
+
+
+class BitParallelTest(unittest.TestCase):
+
+    def test_find_ld_bitparallel(self):
+        for s, t in random_pairs("ld-bitparallel", 60, 150):
+            self.assertEqual(LD.find_ld_bitparallel(s, t), plain_ld(s, t, (1, 1, 1))[-1][-1], (s, t))
+
+
+class EditOpsTest(unittest.TestCase):
+
+    def test_find_edit_ops(self):
+        for s, t in random_pairs("ld-edit-ops", 60):
+            for c in COSTS:
+                ld, ops = LD.find_edit_ops(s, t, c)
+                self.assertEqual(ld, plain_ld(s, t, c)[-1][-1], (s, t, c))
+                # the ops walk both strings left to right and spell out t
+                src = dst = 0
+                for op, src_pos, dst_pos, char in ops:
+                    self.assertEqual((src_pos, dst_pos), (src, dst), (s, t, c))
+                    if op == "M":
+                        self.assertEqual(s[src], t[dst])
+                    elif op == "S":
+                        self.assertNotEqual(s[src], t[dst])
+                    self.assertEqual(char, s[src] if op == "D" else t[dst])
+                    if op != "I":
+                        src += 1
+                    if op != "D":
+                        dst += 1
+                self.assertEqual((src, dst), (len(s), len(t)), (s, t, c))
+
+
+class DistancesTest(unittest.TestCase):
+
+    def test_distances_and_cdist(self):
+        pairs = random_pairs("ld-distances", 12)
+        queries = [x[0] for x in pairs]
+        choices = [x[1] for x in pairs]
+        for c in COSTS:
+            expected = [[plain_ld(q, t, c)[-1][-1] for t in choices] for q in queries]
+            for workers in (None, 2):
+                self.assertEqual([list(LD.distances(q, choices, c, workers)) for q in queries], expected,
+                                 (c, workers))
+                self.assertEqual([list(row) for row in LD.cdist(queries, choices, c, workers)], expected,
+                                 (c, workers))
+
+
+def random_words(seed, count, max_len=8):
+    """
+    Seeded random distinct words over a small alphabet, so many are close.
+    """
+
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice("abcd") for x in range(rng.randrange(max_len + 1))))
+    return sorted(words)
+
+
+class BKTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.words = random_words("ld-bktree", 300)
+        self.queries = random_words("ld-bktree-queries", 20)
+
+    def brute_force(self, word, c):
+        return sorted(((x, plain_ld(word, x, c)[-1][-1]) for x in self.words), key=lambda x: (x[1], x[0]))
+
+    def test_search(self):
+        for c in ((1, 1, 1), (1, 1, 2), (2, 2, 1)):
+            tree = LD.BKTree(self.words, c)
+            self.assertEqual(len(tree), len(self.words))
+            for word in self.queries:
+                expected = self.brute_force(word, c)
+                for k in (0, 1, 2, 3):
+                    self.assertEqual(tree.search(word, k), [x for x in expected if x[1] <= k], (word, k, c))
+
+    def test_nearest(self):
+        for c in ((1, 1, 1), (1, 1, 2)):
+            tree = LD.BKTree(self.words, c)
+            for word in self.queries:
+                expected = self.brute_force(word, c)
+                for n in (1, 3, 10):
+                    found = tree.nearest(word, n)
+                    # ties at the n-th distance may be broken either way
+                    self.assertEqual([x[1] for x in found], [x[1] for x in expected[:n]], (word, n, c))
+                    for x, dist in found:
+                        self.assertEqual(dist, plain_ld(word, x, c)[-1][-1])
+
+    def test_save_load(self):
+        import os
+        import tempfile
+
+        tree = LD.BKTree(self.words)
+        fd, path = tempfile.mkstemp(suffix=".bk")
+        os.close(fd)
+        try:
+            tree.save(path)
+            loaded = LD.BKTree.load(path)
+        finally:
+            os.remove(path)
+        self.assertEqual(len(loaded), len(tree))
+        for word in self.queries:
+            self.assertEqual(loaded.search(word, 2), tree.search(word, 2))
+
+    def test_unequal_costs(self):
+        self.assertRaises(ValueError, LD.BKTree, self.words, (1, 2, 1))
+
+
+class TrieTest(unittest.TestCase):
+
+    def test_fuzzy_lookup(self):
+        words = random_words("ld-trie", 300)
+        for c in ((1, 1, 1), (1, 1, 2), (2, 1, 3), (0.5, 1.5, 1.25)):
+            trie = LD.Trie(words, c)
+            self.assertEqual(len(trie), len(words))
+            for word in random_words("ld-trie-queries", 20):
+                # the query is the source, the dictionary word the target
+                expected = sorted(((x, plain_ld(word, x, c)[-1][-1]) for x in words),
+                                  key=lambda x: (x[1], x[0]))
+                for k in (0, 1, 2, 3.5):
+                    self.assertEqual(trie.fuzzy_lookup(word, k), [x for x in expected if x[1] <= k],
+                                     (word, k, c))
+        self.assertIn(words[0], trie)
+        self.assertFalse(trie.insert(words[0]))
+
+
+class CompiledQueryTest(unittest.TestCase):
+
+    def test_compiled_query(self):
+        for s, t in random_pairs("ld-compiled", 60):
+            for c in COSTS:
+                ld = plain_ld(s, t, c)[-1][-1]
+                query = LD.compile(s, c)
+                self.assertEqual(query.distance(t), ld, (s, t, c))
+                for k in (0, 2, 5):
+                    self.assertEqual(query.distance(t, k), ld if ld <= k else k + 1, (s, t, k, c))
+                    self.assertEqual(query.within(t, k), ld <= k, (s, t, k, c))
+
+    def test_compiled_ratio(self):
+        for s, t in random_pairs("ld-compiled-ratio", 60):
+            self.assertEqual(LD.compile(s).ratio(t), LD.calc_ratio(s, t), (s, t))
+
+
+class LargeCostsTest(unittest.TestCase):
+
+    def test_large_costs(self):
+        s, t = "abc" * 20, "xyz" * 20
+        c = (10 ** 8, 10 ** 8, 10 ** 8)
+        self.assertEqual(LD.find_ld(s, t, c)[0], 6000000000)
+        self.assertEqual(LD.find_ld(s, t, c, matrix=False)[0], 6000000000)
+        self.assertEqual(list(LD.distances(s, [t], c)), [6000000000])
+
+    def test_cell_typecode(self):
+        self.assertEqual(LD._cell_typecode(10, 10, (1, 1, 1)), "i")
+        self.assertEqual(LD._cell_typecode(60, 60, (10 ** 8, 10 ** 8, 10 ** 8)), "q")
+        self.assertEqual(LD._cell_typecode(10, 10, (1, 1, 0.5)), "d")
+
+
+class NumPyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pairs = random_pairs("ld-numpy", 60)
+
+    def test_find_ld_matrix(self):
+        np = LD._np
+        try:
+            for engine in ("python", "numpy"):
+                if engine == "python":
+                    LD._np = False
+                elif LD._numpy() is None:
+                    continue
+                for s, t in self.pairs:
+                    for c in COSTS:
+                        expected = plain_ld(s, t, c)
+                        ld, dist = LD.find_ld(s, t, c)
+                        self.assertEqual(ld, expected[-1][-1], (engine, s, t, c))
+                        if len(s) >= len(t) and t:
+                            self.assertEqual(dist.tolist(), expected, (engine, s, t, c))
+        finally:
+            LD._np = np
+
+    def test_find_ld_numpy(self):
+        if LD._numpy() is None:
+            self.skipTest("numpy is not installed")
+        for s, t in self.pairs:
+            for c in COSTS:
+                expected = plain_ld(s, t, c)
+                ld, dist = LD.find_ld_numpy(s, t, c)
+                self.assertEqual(ld, expected[-1][-1], (s, t, c))
+                if len(s) >= len(t) and t:
+                    self.assertEqual(dist.tolist(), expected, (s, t, c))
+
+    def test_large_sub_cost(self):
+        s, t = "ab" * 20, "ba" * 20 + "c"
+        self.assertEqual(LD.find_ld(s, t, (1, 1, 2 ** 31 - 1))[0], 3)
+
+
+class ParallelTest(unittest.TestCase):
+
+    def test_find_ld_parallel(self):
+        for s, t in random_pairs("ld-parallel", 3, 60):
+            for c in ((1, 1, 1), (2, 3, 4), (1.5, 0.5, 1.25)):
+                self.assertEqual(LD.find_ld_parallel(s, t, c, workers=2, size=8),
+                                 plain_ld(s, t, c)[-1][-1], (s, t, c))
+
+
+class CommandLineTest(unittest.TestCase):
+
+    def run_main(self, argv, stdin=""):
+        import io
+        import json
+        import sys
+        from contextlib import redirect_stdout
+
+        out = io.StringIO()
+        old_stdin = sys.stdin
+        sys.stdin = io.StringIO(stdin)
+        try:
+            with redirect_stdout(out):
+                LD.main(argv)
+        finally:
+            sys.stdin = old_stdin
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_batch_float_costs(self):
+        result = self.run_main(["--batch", "--costs", "1,1,1.5", "--cutoff", "2.5"], "kitten\tsitting\nab\tac\n")
+        self.assertEqual([x["distance"] for x in result], [None, 1.5])
+
+    def test_files_cutoff(self):
+        import os
+        import tempfile
+
+        paths = []
+        try:
+            for lines in (["a", "b", "c", "d", "e"], ["a", "x", "y", "z", "w"]):
+                fd, path = tempfile.mkstemp(suffix=".txt")
+                with os.fdopen(fd, "w") as f:
+                    f.write("\n".join(lines) + "\n")
+                paths.append(path)
+            self.assertEqual(self.run_main(["--files"] + paths), [{"distance": 4}])
+            self.assertEqual(self.run_main(["--files"] + paths + ["--cutoff", "1"]), [{"distance": None}])
+            self.assertEqual(self.run_main(["--files"] + paths + ["--cutoff", "1", "--ops"]), [{"distance": None}])
+            self.assertEqual(self.run_main(["--files"] + paths + ["--cutoff", "4"]), [{"distance": 4}])
+        finally:
+            for path in paths:
+                os.remove(path)
+
+    def test_bad_costs(self):
+        import io
+        from contextlib import redirect_stderr
+
+        for argv in (["--batch", "--costs", "1,x,1"], ["--batch", "--costs", "1,1"], ["--batch", "--cutoff", "x"]):
+            with redirect_stderr(io.StringIO()):
+                self.assertRaises(SystemExit, self.run_main, argv)
+
+
+class TracerTest(unittest.TestCase):
+
+    def test_stats_tracer(self):
+        tracer = LD.StatsTracer()
+        ld, dist = LD.find_ld("lawn", "flaw", tracer=tracer)
+        LD.find_min_path("lawn", "flaw", dist, tracer)
+        LD.find_ld("a" * 1000, "b" * 999, matrix=False, tracer=tracer)
+        stats = tracer.stats()
+        self.assertEqual(stats["calls"], {"find_ld": 1, "find_ld_distance": 1, "find_min_path": 1})
+        self.assertEqual(stats["cells"]["find_ld"], 16)
+        # distance only engines do not report cells
+        self.assertEqual(stats["cells"]["find_ld_distance"], 0)
+
+
+class ExtractTest(unittest.TestCase):
+
+    def test_extract(self):
+        rng = random.Random("ld-extract")
+        # few distinct words, so many choices tie on the score
+        choices = [rng.choice(random_words("ld-extract", 80)) for x in range(200)]
+        for query in random_words("ld-extract-queries", 15):
+            ratios = [(x, LD.calc_ratio(query, x), pos) for pos, x in enumerate(choices)]
+            ratios.sort(key=lambda x: (-x[1], x[2]))
+            for c in ((1, 1, 1), (2, 3, 4), (1, 1, 2)):
+                dists = [(x, plain_ld(query, x, c)[-1][-1], pos) for pos, x in enumerate(choices)]
+                dists.sort(key=lambda x: (x[1], x[2]))
+                for limit in (1, 5, None):
+                    for cutoff in (None, 0, 2, 4.5):
+                        expected = [x for x in dists if cutoff is None or x[1] <= cutoff][:limit]
+                        self.assertEqual(LD.extract(query, choices, limit, cutoff, "distance", c), expected,
+                                         (query, c, limit, cutoff))
+            for limit in (1, 5, None):
+                for cutoff in (None, 0.5, 0.8):
+                    expected = [x for x in ratios if cutoff is None or x[1] >= cutoff][:limit]
+                    self.assertEqual(LD.extract(query, choices, limit, cutoff), expected, (query, limit, cutoff))
+
+
+def brute_clusters(records, linked, min_size=2):
+    """
+    Clusters of records by checking every pair, with a plain union-find.
+    """
+
+    parent = list(range(len(records)))
+
+    def find(x):
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    for a in range(len(records)):
+        for b in range(a + 1, len(records)):
+            if linked(records[a], records[b]):
+                parent[find(b)] = find(a)
+
+    clusters = {}
+    for x in range(len(records)):
+        clusters.setdefault(find(x), []).append((x, records[x]))
+    return sorted(x for x in clusters.values() if len(x) >= min_size)
+
+
+class ClustersTest(unittest.TestCase):
+
+    def test_find_clusters(self):
+        rng = random.Random("ld-clusters")
+        words = random_words("ld-clusters", 60, 10)
+        records = [rng.choice(words) for x in range(60)] + words
+        rng.shuffle(records)
+        for sorted_by_length in (False, True):
+            if sorted_by_length:
+                records = sorted(records, key=len)
+            for k, c in ((0, (1, 1, 1)), (1, (1, 1, 1)), (2, (1, 1, 1)), (3, (2, 2, 1)), (1, (1, 1, 0))):
+                expected = brute_clusters(records, lambda s, t: plain_ld(s, t, c)[-1][-1] <= k)
+                for q in (1, 2, 3):
+                    found = sorted(LD.find_clusters(records, k=k, q=q, c=c, sorted_by_length=sorted_by_length,
+                                                    chunk=50))
+                    self.assertEqual(found, expected, (sorted_by_length, q, k, c))
+            for ratio in (0.6, 0.8):
+                expected = brute_clusters(records, lambda s, t: LD.calc_ratio(s, t) >= ratio)
+                for q in (1, 2, 3):
+                    found = sorted(LD.find_clusters(records, ratio=ratio, q=q, sorted_by_length=sorted_by_length,
+                                                    chunk=50))
+                    self.assertEqual(found, expected, (sorted_by_length, q, ratio))
+
+    def test_find_clusters_workers(self):
+        records = random_words("ld-clusters-workers", 100, 6)
+        expected = brute_clusters(records, lambda s, t: plain_ld(s, t, (1, 1, 1))[-1][-1] <= 1)
+        self.assertEqual(sorted(LD.find_clusters(records, k=1, workers=2, chunk=64)), expected)
+
+
+class IncrementalTest(unittest.TestCase):
+
+    def edits(self, seed, count):
+        """
+        Seeded random appends, pops and set_target calls.
+        """
+
+        rng = random.Random(seed)
+        target = ""
+        for x in range(count):
+            roll = rng.random()
+            if roll < 0.6:
+                target += rng.choice("abcd")
+                yield "append", target[-1], target
+            elif roll < 0.9 and target:
+                target = target[:-1]
+                yield "pop", None, target
+            else:
+                target = target[:rng.randrange(len(target) + 1)] + "".join(
+                    rng.choice("abcd") for y in range(rng.randrange(4)))
+                yield "set_target", target, target
+
+    def test_incremental_ld(self):
+        for source in random_words("ld-incremental", 10):
+            for c in ((1, 1, 1), (2, 3, 4), (1.5, 0.5, 1.25)):
+                inc = LD.IncrementalLD(source, c)
+                for op, arg, target in self.edits(source, 60):
+                    if op == "pop":
+                        inc.pop()
+                    else:
+                        getattr(inc, op)(arg)
+                    dist = plain_ld(source, target, c)
+                    self.assertEqual(inc.target, target)
+                    self.assertEqual(inc.distance, dist[-1][-1], (source, target, c))
+                    self.assertEqual(inc.min, min(row[-1] for row in dist), (source, target, c))
+
+    def test_incremental_matcher(self):
+        candidates = random_words("ld-matcher", 100)
+        for k, c in ((1, (1, 1, 1)), (2, (1, 1, 1)), (3, (2, 1, 3))):
+            matcher = LD.IncrementalMatcher(candidates, k, c)
+            for op, arg, target in self.edits("ld-matcher-{}".format(k), 80):
+                if op == "pop":
+                    matcher.pop()
+                else:
+                    getattr(matcher, op)(arg)
+                full = []
+                prefix = []
+                for x in candidates:
+                    dist = plain_ld(x, target, c)
+                    if dist[-1][-1] <= k:
+                        full.append((x, dist[-1][-1]))
+                    if min(row[-1] for row in dist) <= k:
+                        prefix.append((x, min(row[-1] for row in dist)))
+                self.assertEqual(matcher.target, target)
+                self.assertEqual(matcher.matches(), sorted(full, key=lambda x: (x[1], x[0])), (target, k, c))
+                self.assertEqual(matcher.matches(True), sorted(prefix, key=lambda x: (x[1], x[0])), (target, k, c))
+            # every candidate set aside on the way comes back with the empty target
+            matcher.set_target("")
+            self.assertEqual(len(matcher), len(candidates))
+
+
+class ApproxSearchTest(unittest.TestCase):
+
+    def test_approx_search(self):
+        rng = random.Random("ld-approx")
+        for x in range(30):
+            alphabet = rng.choice(["ab", "acgt"])
+            text = "".join(rng.choice(alphabet) for y in range(rng.randrange(60)))
+            pattern = "".join(rng.choice(alphabet) for y in range(1, rng.randrange(2, 8)))
+            for c in ((1, 1, 1), (2, 3, 4), (1.5, 0.5, 1.25)):
+                for k in (0, 1, 2.5):
+                    # fewest edits of any match ending before each text position
+                    expected = []
+                    for end in range(1, len(text) + 1):
+                        dist = min(plain_ld(pattern, text[start:end], c)[-1][-1] for start in range(end + 1))
+                        if dist <= k:
+                            expected.append((end, dist))
+
+                    for chunked in (text, text.encode("ascii")):
+                        cuts = sorted(rng.randrange(len(text) + 1) for y in range(rng.randrange(5)))
+                        chunks = [chunked[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+                        search = LD.ApproxSearch(pattern, k, c)
+                        found = [match for chunk in chunks for match in search.feed(chunk)]
+                        self.assertEqual(found, expected, (pattern, text, c, k, chunks))
+                    self.assertEqual(list(LD.find_approx(pattern, text, k, c, chunk_size=7)), expected,
+                                     (pattern, text, c, k))
+
+    def test_empty_pattern(self):
+        self.assertRaises(ValueError, LD.ApproxSearch, "", 1)
+
+
+class WeightedTest(unittest.TestCase):
+
+    def random_tables(self, rng, alphabet):
+        # quarter costs add up exactly in floats, so both paths agree to the bit
+        costs = [0.25 * x for x in range(1, 13)] + list(range(1, 4))
+        delete = dict((ch, rng.choice(costs)) for ch in alphabet if rng.random() < 0.5)
+        insert = dict((ch, rng.choice(costs)) for ch in alphabet if rng.random() < 0.5)
+        # only one direction of each pair, so the table is not symmetric
+        sub = dict(((a, b), rng.choice(costs)) for a in alphabet for b in alphabet if rng.random() < 0.4)
+        return delete, insert, sub
+
+    def test_find_ld_weighted(self):
+        if LD._numpy() is None:
+            self.skipTest("numpy is not installed")
+        rng = random.Random("ld-weighted")
+        for s, t in random_pairs("ld-weighted", 60):
+            for c in ((1, 1, 1), (2, 3, 4), (1.5, 0.5, 1.25)):
+                self.assertEqual(LD.find_ld_weighted(s, t, c), plain_ld(s, t, c)[-1][-1], (s, t, c))
+                delete, insert, sub = self.random_tables(rng, "abcdefgt")
+                for a, b in ((s, t), (t, s)):
+                    expected = LD._find_ld_weighted_python(a, b, c, delete, insert, sub)
+                    self.assertEqual(LD.find_ld_weighted(a, b, c, delete, insert, sub), expected,
+                                     (a, b, c, delete, insert, sub))
+
+    def test_keyboard_costs(self):
+        sub = LD.keyboard_costs()
+        self.assertEqual(LD.find_ld_weighted("Lawn", "lawn", sub=sub), 0.25)
+        self.assertEqual(LD.find_ld_weighted("lawn", "lawm", sub=sub), 0.5)
+
+
+class EditScriptTest(unittest.TestCase):
+
+    def test_iter_edit_ops(self):
+        for s, t in random_pairs("ld-edit-script", 60):
+            for c in COSTS:
+                ld, ops = LD.find_edit_ops(s, t, c)
+                self.assertEqual(list(LD.iter_edit_ops(s, t, c)), ops, (s, t, c))
+                self.assertEqual(LD.apply_edits(s, ops), t, (s, t, c))
+                self.assertEqual(LD.apply_edits(list(s), ops), list(t), (s, t, c))
+
+    def test_get_opcodes(self):
+        for s, t in random_pairs("ld-opcodes", 60):
+            opcodes = LD.get_opcodes(s, t)
+            # the opcodes cover both strings in order, like difflib's
+            rebuilt = []
+            i = j = 0
+            for tag, i1, i2, j1, j2 in opcodes:
+                self.assertEqual((i1, j1), (i, j), (s, t))
+                if tag == "equal":
+                    self.assertEqual(s[i1:i2], t[j1:j2], (s, t))
+                rebuilt.append(t[j1:j2])
+                i, j = i2, j2
+            self.assertEqual((i, j), (len(s), len(t)), (s, t))
+            self.assertEqual("".join(rebuilt), t)
+            # runs of matches and runs of edits alternate
+            equal = [x[0] == "equal" for x in opcodes]
+            self.assertTrue(all(a != b for a, b in zip(equal, equal[1:])), (s, t, opcodes))
+
+    def test_apply_edits_errors(self):
+        ops = LD.find_edit_ops("lawn", "flaw")[1]
+        self.assertRaises(ValueError, LD.apply_edits, "lawns", ops)
+        self.assertRaises(ValueError, LD.apply_edits, "lawn", ops[:-1])
+
+
+if __name__ == "__main__":
+    unittest.main()